@@ -1,6 +1,31 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from reviews.models import Category, Genre, Review, Title
+        from reviews.signals import titles_changed
+
+        from . import autocomplete, coalescing
+        from .catalog import invalidate
+
+        for model in (Category, Genre):
+            post_save.connect(invalidate, sender=model)
+            post_delete.connect(invalidate, sender=model)
+        for model in (Title, Review):
+            post_save.connect(coalescing.invalidate, sender=model)
+            post_delete.connect(coalescing.invalidate, sender=model)
+            post_save.connect(autocomplete.invalidate, sender=model)
+            post_delete.connect(autocomplete.invalidate, sender=model)
+        titles_changed.connect(coalescing.invalidate_changed)
+        titles_changed.connect(autocomplete.invalidate)
+
+        if settings.MEMORY_PROFILING:
+            from .memory import start
+
+            start()
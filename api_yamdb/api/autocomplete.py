@@ -0,0 +1,311 @@
+import copy
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Avg, Count, Q
+
+from reviews.models import Change, Title
+
+from .coalescing import single_flight
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'autocomplete:version'
+# Ключи индекса обрезаются до KEY_LENGTH символов, более длинный
+# запрос проверяется по полному названию.
+KEY_LENGTH: int = 32
+# Диапазоны шире SCAN_LIMIT не перебираются при каждом запросе:
+# лучшие произведения для таких префиксов хранятся в TOP_CACHE_SIZE
+# последних списках.
+SCAN_LIMIT: int = 256
+TOP_CACHE_SIZE: int = 4096
+WORD = re.compile(r'\w+')
+LAST_CHAR = '\U0010ffff'
+
+# Индекс воркера заменяется целиком под коротким _lock,
+# поиск читает ссылку без блокировки.
+_index = None
+_lock = threading.Lock()
+_syncer_pid = None
+
+
+def fold(text):
+    """Регистронезависимая форма для поиска: casefold
+    (в том числе для кириллицы), ё как е и одиночные пробелы.
+    """
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def keys_of(name):
+    """Ключи индекса: название с начала каждого слова."""
+    folded = fold(name)
+    return {
+        folded[match.start():match.start() + KEY_LENGTH]
+        for match in WORD.finditer(folded)
+    }
+
+
+def matches(name, query):
+    folded = fold(name)
+    return any(
+        folded.startswith(query, match.start())
+        for match in WORD.finditer(folded)
+    )
+
+
+def title_rows(queryset):
+    visible = Q(reviews__is_hidden=False, reviews__author__is_deleted=False)
+    return queryset.order_by().annotate(
+        review_count=Count('reviews', filter=visible),
+        rating=Avg('reviews__score', filter=visible),
+    ).values_list('pk', 'name', 'year', 'rating', 'review_count')
+
+
+class TitleIndex:
+    """Отсортированный массив ключей с параллельным массивом id
+    произведений. Поиск по префиксу - двоичный поиск диапазона
+    и выбор лучших по числу видимых отзывов, затем по рейтингу.
+    Опубликованный индекс не меняется, кроме кеша top под top_lock:
+    синхронизация строит копию (synced).
+    """
+
+    def __init__(self, rows, cursor, version):
+        self.titles = {}
+        entries = []
+        for row in rows:
+            self.titles[row[0]] = row
+            entries.extend((key, row[0]) for key in keys_of(row[1]))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = [title_id for _, title_id in entries]
+        self.top = OrderedDict()
+        self.top_lock = threading.Lock()
+        self.cursor = cursor
+        self.version = version
+        self.built_at = self.synced_at = time.monotonic()
+
+    def order(self, title_id):
+        _, name, _, rating, reviews = self.titles[title_id]
+        return -reviews, -(rating or 0), name
+
+    def best(self, title_ids, count):
+        return heapq.nsmallest(count, title_ids, key=self.order)
+
+    def search(self, query, limit):
+        query = fold(query)
+        prefix = query[:KEY_LENGTH]
+        if not prefix:
+            return []
+        low = bisect_left(self.keys, prefix)
+        high = bisect_left(self.keys, prefix + LAST_CHAR, low)
+        if len(query) > KEY_LENGTH:
+            found = self.best({
+                title_id for title_id in self.ids[low:high]
+                if matches(self.titles[title_id][1], query)
+            }, limit)
+        elif high - low <= SCAN_LIMIT:
+            found = self.best(set(self.ids[low:high]), limit)
+        else:
+            with self.top_lock:
+                found = self.top.get(prefix)
+                if found is not None:
+                    self.top.move_to_end(prefix)
+            if found is None:
+                found = self.best(
+                    set(self.ids[low:high]), settings.AUTOCOMPLETE_MAX_LIMIT)
+                with self.top_lock:
+                    self.top[prefix] = found
+                    if len(self.top) > TOP_CACHE_SIZE:
+                        self.top.popitem(last=False)
+        return [
+            # Рейтинг целым числом, как в ReadTitleSerializer.
+            {'id': title_id, 'name': name, 'year': year,
+             'rating': None if rating is None else int(rating)}
+            for title_id, name, year, rating, _ in (
+                self.titles[title_id] for title_id in found[:limit])
+        ]
+
+    def forget(self, key):
+        for length in range(1, len(key) + 1):
+            self.top.pop(key[:length], None)
+
+    def remove(self, title_id):
+        row = self.titles.pop(title_id, None)
+        if row is None:
+            return
+        for key in keys_of(row[1]):
+            self.forget(key)
+            position = bisect_left(self.keys, key)
+            while self.ids[position] != title_id:
+                position += 1
+            del self.keys[position]
+            del self.ids[position]
+
+    def add(self, row):
+        self.titles[row[0]] = row
+        for key in keys_of(row[1]):
+            self.forget(key)
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.ids.insert(position, row[0])
+
+    def sync(self):
+        """Применяет изменения произведений и их отзывов из журнала
+        после курсора. Курсор сдвигается только по записям, перед
+        которыми новые уже не появятся (Change.objects.settled),
+        остальные применяются повторно при следующей синхронизации.
+        """
+        changes = Change.objects.after(self.cursor).filter(
+            model__in=('title', 'review'))
+        settled = changes.settled().values_list('txid', 'pk').last()
+        title_ids = {
+            object_id if model == 'title' else parent_id
+            for model, object_id, parent_id
+            in changes.values_list('model', 'object_id', 'parent_id')
+        }
+        rows = title_rows(
+            Title.objects.filter(pk__in=title_ids, is_deleted=False))
+        for row in rows:
+            self.remove(row[0])
+            self.add(row)
+            title_ids.discard(row[0])
+        for title_id in title_ids:
+            self.remove(title_id)
+        if settled is not None:
+            self.cursor = settled
+        self.synced_at = time.monotonic()
+
+    def synced(self, version):
+        """Копия индекса, догнавшая журнал изменений."""
+        index = copy.copy(self)
+        index.titles = dict(self.titles)
+        index.keys = list(self.keys)
+        index.ids = list(self.ids)
+        with self.top_lock:
+            index.top = OrderedDict(self.top)
+        index.top_lock = threading.Lock()
+        index.version = version
+        index.sync()
+        return index
+
+
+def build():
+    cursor = Change.objects.settled().values_list('txid', 'pk').last()
+    version = cache.get(VERSION_KEY)
+    index = TitleIndex(
+        title_rows(Title.objects.filter(is_deleted=False)),
+        cursor or (0, 0), version)
+    index.sync()
+    return index
+
+
+def publish(index, replaces):
+    """Заменяет индекс воркера, если его не заменили раньше."""
+    global _index
+    with _lock:
+        if _index is replaces:
+            _index = index
+        return _index
+
+
+def warm_up():
+    """Строит индекс в мастер-процессе до fork: воркеры получают
+    его готовым. Соединения с базой закрываются, чтобы воркеры
+    не унаследовали общий сокет. Если база недоступна, индекс
+    построит первый запрос подсказок.
+    """
+    try:
+        publish(build(), None)
+    except DatabaseError:
+        logger.exception('Индекс подсказок не построен при прогреве')
+    finally:
+        connections.close_all()
+
+
+def refreshed(index):
+    """Новый индекс вместо index или None, если он еще актуален:
+    копия, догнавшая журнал изменений, после правок произведений
+    или раз в AUTOCOMPLETE_SYNC_INTERVAL. Отзывы пользователя
+    при его скрытии и возврате попадают в журнал
+    (reviews.signals.log_user_saved), а правки в обход журнала
+    исправляет полная перестройка раз в AUTOCOMPLETE_REBUILD_INTERVAL.
+    """
+    now = time.monotonic()
+    if now - index.built_at >= settings.AUTOCOMPLETE_REBUILD_INTERVAL:
+        return build()
+    version = cache.get(VERSION_KEY)
+    if (version != index.version
+            or now - index.synced_at >= settings.AUTOCOMPLETE_SYNC_INTERVAL):
+        return index.synced(version)
+    return None
+
+
+def sync_forever():
+    """Фоновая синхронизация индекса воркера: раз в
+    AUTOCOMPLETE_CHECK_INTERVAL подменяет индекс обновленным.
+    """
+    while True:
+        time.sleep(settings.AUTOCOMPLETE_CHECK_INTERVAL)
+        index = _index
+        if index is None:
+            continue
+        try:
+            new_index = refreshed(index)
+            if new_index is not None:
+                publish(new_index, index)
+        except Exception:
+            logger.exception('Ошибка синхронизации индекса подсказок')
+        finally:
+            connections.close_all()
+
+
+def start_syncer():
+    """Запускает фоновую синхронизацию в текущем процессе:
+    потоки мастер-процесса не переживают fork, поэтому поток
+    запускается в каждом воркере при первом поиске.
+    """
+    global _syncer_pid
+    if _syncer_pid == os.getpid():
+        return
+    with _lock:
+        if _syncer_pid == os.getpid():
+            return
+        _syncer_pid = os.getpid()
+    threading.Thread(
+        target=sync_forever, name='autocomplete-sync', daemon=True).start()
+
+
+def get_index():
+    """Индекс воркера. Если прогрев его не построил, строит
+    при первом запросе: одновременные запросы ждут одного построения.
+    """
+    index = _index
+    if index is None:
+        index = publish(single_flight('autocomplete:build', build), None)
+    return index
+
+
+def search(query, limit):
+    start_syncer()
+    return get_index().search(query, limit)
+
+
+def bump_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate(sender, **kwargs):
+    """Сообщает воркерам о правке произведения или отзыва
+    после фиксации транзакции.
+    """
+    transaction.on_commit(bump_version)
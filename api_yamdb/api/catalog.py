@@ -0,0 +1,62 @@
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.db import transaction
+
+from reviews.models import Category, Genre
+
+VERSION_KEY = 'catalog:version'
+
+CatalogSnapshot = namedtuple(
+    'CatalogSnapshot',
+    ('version', 'categories', 'genres', 'category_ids', 'genre_ids')
+)
+
+_snapshot = None
+
+
+def _freeze(queryset):
+    rows = tuple(
+        MappingProxyType(row) for row in queryset.values('id', 'name', 'slug')
+    )
+    items = tuple(
+        MappingProxyType({'name': row['name'], 'slug': row['slug']})
+        for row in rows
+    )
+    ids = MappingProxyType({row['slug']: row['id'] for row in rows})
+    return items, ids
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_snapshot():
+    """Неизменяемый снимок категорий и жанров в памяти процесса.
+    Содержит списки в формате сериализаторов и словари slug -> id.
+    Актуальность проверяется сверкой версии в общем кеше,
+    снимок перестраивается двумя запросами только после изменений.
+    """
+    global _snapshot
+    version = _current_version()
+    if _snapshot is None or _snapshot.version != version:
+        categories, category_ids = _freeze(Category.objects.all())
+        genres, genre_ids = _freeze(Genre.objects.all())
+        _snapshot = CatalogSnapshot(
+            version, categories, genres, category_ids, genre_ids)
+    return _snapshot
+
+
+def bump_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate(sender, **kwargs):
+    """Меняет версию снимка во всех воркерах после фиксации транзакции."""
+    transaction.on_commit(bump_version)
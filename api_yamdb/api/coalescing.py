@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .catalog import VERSION_KEY
+
+POLL_INTERVAL: float = 0.05
+# Бэкенды кеша с атомарным cache.add: memcached и redis.
+ATOMIC_ADD_BACKENDS = (
+    'django.core.cache.backends.memcached.',
+    'django_redis.cache.',
+)
+
+_flights = {}
+_flights_lock = threading.Lock()
+# Смена версий, ожидающая фиксации транзакции, по псевдониму базы.
+_pending = threading.local()
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+def single_flight(key, compute):
+    """Одновременные вызовы с одним ключом в процессе ждут
+    одного вычисления. Если ведущий вызов упал, остальные
+    вычисляют результат сами.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+    if not leader:
+        if (flight.done.wait(settings.COALESCE_LOCK_TIMEOUT)
+                and not flight.failed):
+            return flight.result
+        return compute()
+    try:
+        flight.result = compute()
+        return flight.result
+    except BaseException:
+        flight.failed = True
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def title_version_key(title_id):
+    return f'coalesce:title:{title_id}'
+
+
+def title_versions(title_id):
+    """Ключи версий, от которых зависят страницы произведения:
+    само произведение с отзывами и справочник категорий и жанров.
+    """
+    return (title_version_key(title_id), VERSION_KEY)
+
+
+class TitleBump:
+    """Смена версий произведений, накопленных за транзакцию."""
+
+    def __init__(self, title_ids):
+        self.title_ids = set(title_ids)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        cache.set_many(
+            {title_version_key(title_id): uuid.uuid4().hex
+             for title_id in self.title_ids},
+            settings.COALESCE_STALE_TTL
+        )
+
+
+def invalidate_titles(title_ids, using=None):
+    """Меняет версии произведений после фиксации транзакции.
+    За транзакцию регистрируется одна смена версий, в которую
+    добавляются все затронутые произведения: каскадное удаление тысяч
+    отзывов дает одну запись в кеш. Ссылка на нее слабая: после
+    фиксации или отката Django отпускает функцию, и следующая
+    транзакция регистрирует новую.
+    """
+    title_ids = set(title_ids)
+    if not title_ids:
+        return
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        TitleBump(title_ids)()
+        return
+    pending = getattr(_pending, connection.alias, None)
+    bump = pending and pending()
+    if bump is not None and not bump.done:
+        bump.title_ids.update(title_ids)
+        return
+    bump = TitleBump(title_ids)
+    setattr(_pending, connection.alias, weakref.ref(bump))
+    transaction.on_commit(bump, using)
+
+
+def invalidate(sender, instance, **kwargs):
+    title_id = instance.pk if sender._meta.model_name == 'title' else (
+        instance.title_id)
+    invalidate_titles((title_id,))
+
+
+def invalidate_changed(sender, title_ids, **kwargs):
+    invalidate_titles(title_ids)
+
+
+def fetch(key, version_keys, compute):
+    """Результат compute из общего кеша, пока версии не изменились
+    и не истек COALESCE_TTL. Пересчитывает его только один воркер,
+    захвативший блокировку в кеше, остальные в это время отдают
+    прежний результат или, если его нет, ждут нового. Без атомарного
+    cache.add (shared_lock) каждый воркер пересчитывает сам,
+    одновременные запросы внутри воркера по-прежнему объединяются.
+    """
+    value_key = 'coalesce:' + hashlib.md5(key.encode()).hexdigest()
+    cached = cache.get_many((value_key, *version_keys))
+    version = tuple(cached.get(version_key) for version_key in version_keys)
+    entry = cached.get(value_key)
+    if entry is not None and entry[0] == version and entry[1] > time.time():
+        return entry[2]
+    return single_flight(
+        (value_key, version),
+        lambda: refresh(value_key, version, entry, compute)
+    )
+
+
+def shared_lock():
+    """Блокировка пересчета между воркерами возможна, только если
+    cache.add в бэкенде атомарен. В файловом кеше add - проверка
+    и запись без блокировки, два воркера захватили бы ее одновременно.
+    """
+    return settings.CACHES['default']['BACKEND'].startswith(
+        ATOMIC_ADD_BACKENDS)
+
+
+def store(value_key, version, compute):
+    data = compute()
+    cache.set(
+        value_key,
+        (version, time.time() + settings.COALESCE_TTL, data),
+        settings.COALESCE_STALE_TTL
+    )
+    return data
+
+
+def refresh(value_key, version, entry, compute):
+    if not shared_lock():
+        return store(value_key, version, compute)
+    lock_key = value_key + ':lock'
+    if cache.add(lock_key, 1, settings.COALESCE_LOCK_TIMEOUT):
+        try:
+            return store(value_key, version, compute)
+        finally:
+            cache.delete(lock_key)
+    if entry is not None:
+        return entry[2]
+    deadline = time.monotonic() + settings.COALESCE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(value_key)
+        if entry is not None and entry[0] == version:
+            return entry[2]
+        if not cache.get(lock_key):
+            break
+    return compute()
@@ -1,17 +1,96 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Q, Value,
+                              When)
+from django.db.models.functions import Cast, Greatest
 from django_filters import rest_framework as filter
+from rest_framework.filters import SearchFilter
 
-from reviews.models import Title
+from reviews.models import Category, Genre, GenreTitle, Title
+
+TRIGRAM_MIN_LENGTH: int = 3
+
+MAX_FILTER_VALUES: int = 20
+
+
+class CharInFilter(filter.BaseInFilter, filter.CharFilter):
+    """Фильтр по списку значений через запятую."""
 
 
 class TitleFilter(filter.FilterSet):
     """Фильтр для вьюсета произведений. Фильтрация по полям
     'genre', 'category', 'name', 'year'.
+    Жанры и категории принимают несколько slug через запятую,
+    для жанров genre_mode=all требует наличия всех жанров.
+    Связи проверяются подзапросами EXISTS, поэтому выборка
+    не размножает строки и не искажает рейтинг.
     """
-    genre = filter.CharFilter(field_name='genre__slug')
-    category = filter.CharFilter(field_name='category__slug')
+    genre = CharInFilter(method='filter_genre')
+    genre_mode = filter.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')), method='filter_noop')
+    category = CharInFilter(method='filter_category')
     name = filter.CharFilter(field_name='name')
+    name_prefix = filter.CharFilter(
+        field_name='name', lookup_expr='istartswith')
     year = filter.NumberFilter(field_name='year')
+    year_min = filter.NumberFilter(field_name='year', lookup_expr='gte')
+    year_max = filter.NumberFilter(field_name='year', lookup_expr='lte')
 
     class Meta:
         model = Title
-        fields = ('genre', 'category', 'name', 'year',)
+        fields = ('genre', 'genre_mode', 'category', 'name', 'name_prefix',
+                  'year', 'year_min', 'year_max',)
+
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+    def filter_genre(self, queryset, name, value):
+        slugs = value[:MAX_FILTER_VALUES]
+        if self.form.cleaned_data.get('genre_mode') == 'all':
+            for slug in set(slugs):
+                queryset = queryset.filter(Exists(GenreTitle.objects.filter(
+                    title=OuterRef('pk'), genre__slug=slug)))
+            return queryset
+        return queryset.filter(Exists(GenreTitle.objects.filter(
+            title=OuterRef('pk'),
+            genre__in=Genre.objects.filter(slug__in=slugs).values('pk')
+        )))
+
+    def filter_category(self, queryset, name, value):
+        return queryset.filter(category__in=Category.objects.filter(
+            slug__in=value[:MAX_FILTER_VALUES]).values('pk'))
+
+
+class UserSearchFilter(SearchFilter):
+    """Поиск пользователей по username и email с ранжированием.
+    В PostgreSQL подстрока ищется по триграммным индексам pg_trgm,
+    короткие запросы и другие СУБД ищут по префиксу.
+    Результат аннотируется полем rank: точное совпадение,
+    затем совпадение префикса, затем триграммная схожесть.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        trigram = (connections[queryset.db].vendor == 'postgresql'
+                   and len(term) >= TRIGRAM_MIN_LENGTH)
+        lookup = 'icontains' if trigram else 'istartswith'
+        rank = Case(
+            When(Q(username__iexact=term) | Q(email__iexact=term),
+                 then=Value(2000)),
+            When(Q(username__istartswith=term) | Q(email__istartswith=term),
+                 then=Value(1000)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        if trigram:
+            rank += Cast(
+                Greatest(TrigramSimilarity('username', term),
+                         TrigramSimilarity('email', term)) * 1000,
+                IntegerField()
+            )
+        return queryset.filter(
+            Q(**{f'username__{lookup}': term})
+            | Q(**{f'email__{lookup}': term})
+        ).annotate(rank=rank)
@@ -0,0 +1,69 @@
+import time
+
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+SIGNUP_URL = '/api/v1/auth/signup/'
+TOKEN_URL = '/api/v1/auth/token/'
+
+
+class Command(BaseCommand):
+    help = ('Замер пропускной способности регистрации и выдачи JWT токенов. '
+            'Все созданные данные откатываются по завершении.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Количество регистраций и выдач токена.'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        client = Client()
+        total = options['requests']
+        with transaction.atomic():
+            codes = self.run_phase(
+                'Регистрация', total,
+                lambda number: self.signup(client, number)
+            )
+            self.run_phase(
+                'Выдача токена', total,
+                lambda number: self.obtain_token(client, number, codes)
+            )
+            transaction.set_rollback(True)
+
+    def run_phase(self, name, total, request):
+        results = {}
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for number in range(total):
+                results[number] = request(number)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name}: {total / elapsed:.0f} запросов/с, '
+            f'{elapsed / total * 1000:.2f} мс на запрос, '
+            f'{len(queries) / total:.1f} SQL-запросов на запрос'
+        )
+        return results
+
+    def signup(self, client, number):
+        response = client.post(SIGNUP_URL, {
+            'username': f'benchmark_{number}',
+            'email': f'benchmark_{number}@yamdb.fake',
+        })
+        if response.status_code != 200:
+            raise CommandError(f'Регистрация: {response.content}')
+        return mail.outbox[-1].body.split(': ')[-1]
+
+    def obtain_token(self, client, number, codes):
+        response = client.post(TOKEN_URL, {
+            'username': f'benchmark_{number}',
+            'confirmation_code': codes[number],
+        })
+        if response.status_code != 200:
+            raise CommandError(f'Выдача токена: {response.content}')
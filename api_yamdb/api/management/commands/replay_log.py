@@ -0,0 +1,273 @@
+import argparse
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import Resolver404, resolve
+from rest_framework_simplejwt.tokens import AccessToken
+
+from reviews.models import User
+
+# Формат combined: используется nginx по умолчанию и gunicorn.
+LOG_LINE = re.compile(
+    r'(?P<host>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" (?P<status>\d{3}) '
+)
+LOG_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+ANONYMOUS = 'anonymous'
+ROLES = (User.USER, User.MODERATOR, User.ADMIN)
+PERCENTILES = (50, 90, 99)
+
+
+def parse_log(lines):
+    """Разбирает строки access-лога в словари запросов."""
+    for line in lines:
+        match = LOG_LINE.match(line)
+        if match is None:
+            continue
+        yield {
+            'time': datetime.strptime(match['time'], LOG_TIME_FORMAT),
+            'method': match['method'],
+            'path': match['path'],
+        }
+
+
+def endpoint_of(path):
+    """Маршрут из api/urls.py, которому соответствует путь."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return 'unmatched'
+    return match.route.replace('^', '').replace('$', '')
+
+
+def role_of(method, route):
+    """Роль, от имени которой повторяется запрос.
+    В access-логе нет токена, поэтому роль выводится из маршрута:
+    чтение открытых ресурсов анонимно, запись отзывов и комментариев
+    от пользователя, правка чужих отзывов от модератора,
+    управление пользователями и каталогом от администратора.
+    """
+    if 'auth/' in route:
+        return ANONYMOUS
+    if 'users/me' in route:
+        return User.USER
+    if route.startswith('api/v1/users/'):
+        return User.ADMIN
+    if method in SAFE_METHODS:
+        return ANONYMOUS
+    if 'reviews' in route:
+        return User.USER if method == 'POST' else User.MODERATOR
+    return User.ADMIN
+
+
+def role_token(value):
+    """Значение --token в виде РОЛЬ=ТОКЕН."""
+    role, separator, token = value.partition('=')
+    if not separator or role not in ROLES or not token:
+        raise argparse.ArgumentTypeError(
+            f'Ожидается РОЛЬ=ТОКЕН, роль из {", ".join(ROLES)}.')
+    return role, token
+
+
+def percentile(values, rank):
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * rank // 100) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Повтор запросов из access-лога nginx или gunicorn '
+            'в процессе или против запущенного сервера '
+            'с отчетом о задержках, ошибках и SQL-запросах по маршрутам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='Путь к access-логу.')
+        parser.add_argument(
+            '--target',
+            help=('Адрес сервера, например http://localhost:8000. '
+                  'Без него запросы выполняются в процессе.')
+        )
+        parser.add_argument(
+            '--speed',
+            type=float,
+            default=1.0,
+            help=('Множитель скорости относительно исходного темпа. '
+                  '0 - отправлять без пауз.')
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Количество одновременных запросов.'
+        )
+        parser.add_argument(
+            '--include-writes',
+            action='store_true',
+            help=('Повторять и изменяющие запросы. Тела запросов '
+                  'в логе нет, поэтому они отправляются пустыми. '
+                  'В процессе каждый такой запрос выполняется '
+                  'в транзакции, которая откатывается.')
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Повторить только первые N запросов.'
+        )
+        parser.add_argument(
+            '--token',
+            type=role_token,
+            action='append',
+            default=[],
+            metavar='РОЛЬ=ТОКЕН',
+            help=('Токен доступа для роли user, moderator или admin. '
+                  'С --target нужен для каждой роли из лога. Без --target '
+                  'для ролей без токена на время повтора создаются '
+                  'временные пользователи.')
+        )
+
+    def handle(self, *args, **options):
+        entries = self.load(options)
+        if not entries:
+            raise CommandError('В логе нет подходящих запросов.')
+        self.target = options['target']
+        self.tokens = {ANONYMOUS: None, **dict(options['token'])}
+        missing = {entry['role'] for entry in entries} - self.tokens.keys()
+        if self.target and missing:
+            raise CommandError(
+                f'Для повтора против {self.target} передайте --token '
+                f'для ролей: {", ".join(sorted(missing))}.'
+            )
+        if not self.target:
+            setup_test_environment()
+        users = self.create_users(missing)
+        try:
+            self.replay_all(entries, options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def replay_all(self, entries, options):
+        self.local = threading.local()
+        self.results = defaultdict(list)
+        self.lock = threading.Lock()
+        started = time.monotonic()
+        origin = entries[0]['time']
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for entry in entries:
+                if options['speed'] > 0:
+                    offset = (entry['time'] - origin).total_seconds()
+                    delay = (offset / options['speed']
+                             - (time.monotonic() - started))
+                    if delay > 0:
+                        time.sleep(delay)
+                executor.submit(self.replay, entry)
+        self.report(time.monotonic() - started)
+
+    def load(self, options):
+        with open(options['log'], encoding='utf-8', errors='replace') as log:
+            entries = [
+                entry for entry in parse_log(log)
+                if options['include_writes'] or entry['method'] in SAFE_METHODS
+            ]
+        entries.sort(key=lambda entry: entry['time'])
+        for entry in entries:
+            entry['endpoint'] = endpoint_of(entry['path'])
+            entry['role'] = role_of(entry['method'], entry['endpoint'])
+        return entries[:options['limit']]
+
+    def create_users(self, roles):
+        """Временные пользователи для ролей без токена при повторе
+        в процессе. Удаляются вместе с их записями после повтора.
+        """
+        users = []
+        for role in sorted(roles):
+            name = f'replay_{role}_{secrets.token_hex(4)}'
+            user = User.objects.create(
+                username=name, email=f'{name}@yamdb.fake', role=role)
+            users.append(user)
+            self.tokens[role] = str(AccessToken.for_user(user))
+        return users
+
+    def replay(self, entry):
+        token = self.tokens[entry['role']]
+        started = time.perf_counter()
+        try:
+            if self.target:
+                status, queries = self.send_http(entry, token), None
+            else:
+                status, queries = self.send_local(entry, token)
+        except Exception:
+            status, queries = None, None
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.results[(entry['method'], entry['endpoint'])].append(
+                (elapsed, status, queries))
+
+    def send_http(self, entry, token):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = session.request(
+            entry['method'], self.target.rstrip('/') + entry['path'],
+            headers=headers, timeout=30,
+        )
+        return response.status_code
+
+    def send_local(self, entry, token):
+        """Запрос через тестовый клиент. Изменяющие запросы выполняются
+        в транзакции, которая откатывается, чтобы повтор в процессе
+        не оставлял в базе созданные от имени ролей записи.
+        """
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        writes = entry['method'] not in SAFE_METHODS
+        with transaction.atomic() if writes else nullcontext():
+            with CaptureQueriesContext(connection) as captured:
+                response = client.generic(
+                    entry['method'], entry['path'], **extra)
+            if writes:
+                transaction.set_rollback(True)
+        return response.status_code, len(captured)
+
+    def report(self, elapsed):
+        total = sum(len(results) for results in self.results.values())
+        self.stdout.write(
+            f'Повторено {total} запросов за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.1f} запросов/с).'
+        )
+        header = ' '.join(f'p{rank:<6}' for rank in PERCENTILES)
+        self.stdout.write(
+            f'{"запрос":<60} {"всего":>6} {"4xx":>5} {"ошибок":>6} '
+            f'{header} {"SQL":>5}'
+        )
+        for (method, endpoint), results in sorted(self.results.items()):
+            latencies = [elapsed * 1000 for elapsed, _, _ in results]
+            statuses = [status for _, status, _ in results]
+            client_errors = sum(
+                1 for status in statuses if status and 400 <= status < 500)
+            errors = sum(
+                1 for status in statuses if status is None or status >= 500)
+            queries = [count for _, _, count in results if count is not None]
+            average_queries = (f'{sum(queries) / len(queries):5.1f}'
+                               if queries else '    -')
+            line = ' '.join(
+                f'{percentile(latencies, rank):7.1f}' for rank in PERCENTILES)
+            self.stdout.write(
+                f'{method + " /" + endpoint:<60} {len(results):>6} '
+                f'{client_errors:>5} {errors:>6} {line} {average_queries}'
+            )
@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILE_SCRIPT = '''
+import json
+import sys
+import time
+
+started = time.perf_counter()
+import django
+from django.conf import settings
+django.setup()
+setup_time = time.perf_counter() - started
+
+started = time.perf_counter()
+from api_yamdb.wsgi import application
+wsgi_time = time.perf_counter() - started
+
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+client = Client()
+timings = []
+for _ in range(2):
+    started = time.perf_counter()
+    response = client.get(sys.argv[1])
+    timings.append(time.perf_counter() - started)
+print(json.dumps({
+    'setup': setup_time,
+    'wsgi': wsgi_time,
+    'first': timings[0],
+    'second': timings[1],
+    'status': response.status_code,
+}))
+'''
+
+
+def parse_importtime(stderr, top):
+    """Возвращает самые долгие импорты верхнего уровня
+    из вывода python -X importtime.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  '):
+            cumulative = cumulative.strip()
+            if cumulative.isdigit():
+                imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+class Command(BaseCommand):
+    help = ('Замер времени импорта, загрузки WSGI-приложения '
+            'и первого запроса в новом процессе с прогревом и без него.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='/api/v1/categories/',
+            help='Адрес, на который отправляется первый запрос.'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Сколько самых долгих импортов показать.'
+        )
+
+    def handle(self, *args, **options):
+        for warm_up in (False, True):
+            self.profile(warm_up, options['path'], options['top'])
+
+    def profile(self, warm_up, path, top):
+        env = dict(os.environ, WARM_UP=str(warm_up))
+        completed = subprocess.run(
+            (sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT, path),
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode:
+            raise CommandError(completed.stderr.splitlines()[-1])
+        result = json.loads(completed.stdout.splitlines()[-1])
+        mode = 'с прогревом' if warm_up else 'без прогрева'
+        self.stdout.write(f'--- Запуск {mode} ---')
+        self.stdout.write(f'django.setup(): {result["setup"] * 1000:.1f} мс')
+        self.stdout.write(
+            f'Загрузка WSGI-приложения: {result["wsgi"] * 1000:.1f} мс')
+        self.stdout.write(
+            f'Первый запрос GET {path}: {result["first"] * 1000:.1f} мс '
+            f'(статус {result["status"]})'
+        )
+        self.stdout.write(
+            f'Повторный запрос: {result["second"] * 1000:.1f} мс')
+        if warm_up or not top:
+            return
+        self.stdout.write('Самые долгие импорты:')
+        for cumulative, name in parse_importtime(completed.stderr, top):
+            self.stdout.write(f'  {cumulative / 1000:8.1f} мс  {name}')
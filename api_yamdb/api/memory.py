@@ -0,0 +1,208 @@
+import gc
+import inspect
+import logging
+import os
+import re
+import resource
+import time
+import tracemalloc
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from rest_framework import serializers
+
+from . import serializers as api_serializers
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = re.compile(r'^[0-9]+-[0-9]+$')
+SNAPSHOT_LIMIT: int = 10
+# Аллокации самого tracemalloc и импорта модулей в отчет не попадают.
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+# Пиковое выделение по маршрутам в этом воркере: число запросов,
+# максимум и сумма пиков в байтах.
+request_peaks = {}
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_PROFILE_FRAMES)
+
+
+def rss():
+    """Текущий и максимальный RSS процесса в байтах."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    try:
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        current = None
+    return current, peak
+
+
+def tracked_classes():
+    """Модели проекта и сериализаторы из api/serializers.py."""
+    classes = {model: model._meta.label for model in apps.get_models()}
+    for name, serializer_class in inspect.getmembers(
+            api_serializers, inspect.isclass):
+        if (issubclass(serializer_class, serializers.BaseSerializer)
+                and serializer_class.__module__ == api_serializers.__name__):
+            classes[serializer_class] = f'api.serializers.{name}'
+    classes[serializers.ListSerializer] = 'rest_framework.ListSerializer'
+    return classes
+
+
+def object_counts():
+    """Число живых экземпляров моделей и сериализаторов.
+    Перед подсчетом собирается мусор, чтобы не учитывать циклы,
+    которые уже никому не доступны.
+    """
+    gc.collect()
+    classes = tracked_classes()
+    counts = Counter(
+        classes[type(obj)] for obj in gc.get_objects()
+        if type(obj) in classes
+    )
+    return dict(counts.most_common())
+
+
+def status():
+    current, peak = rss()
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'rss': current,
+        'rss_peak': peak,
+        'tracing': tracemalloc.is_tracing(),
+        'traced': traced,
+        'traced_peak': traced_peak,
+        'objects': object_counts(),
+        'requests': request_peaks,
+        'snapshots': list_snapshots(),
+    }
+
+
+def snapshot_path(snapshot_id):
+    return os.path.join(settings.MEMORY_SNAPSHOT_DIR, f'{snapshot_id}.dump')
+
+
+def snapshot_ids():
+    """Id всех снимков в MEMORY_SNAPSHOT_DIR."""
+    try:
+        names = os.listdir(settings.MEMORY_SNAPSHOT_DIR)
+    except FileNotFoundError:
+        return []
+    return [
+        snapshot_id for snapshot_id in (
+            name[:-len('.dump')] for name in names if name.endswith('.dump'))
+        if SNAPSHOT_ID.match(snapshot_id)
+    ]
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def list_snapshots():
+    """Снимки этого воркера, от старых к новым."""
+    pid = str(os.getpid())
+    return sorted(
+        (snapshot_id for snapshot_id in snapshot_ids()
+         if snapshot_id.split('-')[0] == pid),
+        key=lambda snapshot_id: int(snapshot_id.split('-')[1])
+    )
+
+
+def take_snapshot():
+    """Снимает аллокации воркера и сохраняет снимок в файл,
+    чтобы сравнить его мог любой воркер. Если трассировка
+    не была включена, она запускается и первый снимок служит базой.
+    Хранятся последние SNAPSHOT_LIMIT снимков воркера, снимки
+    завершившихся воркеров удаляются.
+    """
+    start()
+    snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    snapshot_id = f'{os.getpid()}-{time.time_ns() // 1000000}'
+    os.makedirs(settings.MEMORY_SNAPSHOT_DIR, exist_ok=True)
+    snapshot.dump(snapshot_path(snapshot_id))
+    stale = list_snapshots()[:-SNAPSHOT_LIMIT]
+    stale.extend(
+        other for other in snapshot_ids()
+        if not is_alive(int(other.split('-')[0]))
+    )
+    for stale_id in stale:
+        try:
+            os.remove(snapshot_path(stale_id))
+        except FileNotFoundError:
+            # Снимок уже удалил другой воркер.
+            pass
+    return snapshot_id
+
+
+def load_snapshot(snapshot_id):
+    """Снимок по id или None, если такого снимка нет."""
+    if not SNAPSHOT_ID.match(snapshot_id):
+        return None
+    try:
+        return tracemalloc.Snapshot.load(snapshot_path(snapshot_id))
+    except FileNotFoundError:
+        return None
+
+
+def compare(first, second, key_type, limit):
+    """Разница двух снимков, сгруппированная по файлу или строке,
+    по убыванию роста занятой памяти.
+    """
+    return [
+        {
+            'file': stat.traceback[0].filename,
+            'line': stat.traceback[0].lineno if key_type != 'filename'
+            else None,
+            'size': stat.size,
+            'size_diff': stat.size_diff,
+            'count': stat.count,
+            'count_diff': stat.count_diff,
+        }
+        for stat in second.compare_to(first, key_type)[:limit]
+    ]
+
+
+def begin_request():
+    """Сбрасывает пик перед запросом. В Python без reset_peak
+    пик процесса не сбрасывается, и рост за запрос считается
+    только если запрос поднял его выше прежнего.
+    """
+    reset_peak = getattr(tracemalloc, 'reset_peak', None)
+    if reset_peak is not None:
+        reset_peak()
+    return tracemalloc.get_traced_memory()
+
+
+def end_request(request, before):
+    current_before, peak_before = before
+    _, peak = tracemalloc.get_traced_memory()
+    growth = max(0, peak - current_before) if peak > peak_before else 0
+    match = request.resolver_match
+    path = (match.route.replace('^', '').replace('$', '') if match
+            else request.path.lstrip('/'))
+    route = f'{request.method} /{path}'
+    record = request_peaks.setdefault(
+        route, {'count': 0, 'max': 0, 'total': 0})
+    record['count'] += 1
+    record['max'] = max(record['max'], growth)
+    record['total'] += growth
+    logger.info('%s: пик %d байт', route, growth)
+    return growth
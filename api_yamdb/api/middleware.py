@@ -0,0 +1,52 @@
+import re
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import memory
+from .queries import QueryInspector
+
+
+class RequestMemoryMiddleware:
+    """Пиковое выделение памяти за каждый запрос к адресам,
+    подходящим под MEMORY_PROFILE_PATH. Без этой настройки
+    middleware отключается при старте и ничего не стоит.
+    Замер верен для воркеров, обрабатывающих по одному запросу.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILE_PATH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pattern = re.compile(settings.MEMORY_PROFILE_PATH)
+        memory.start()
+
+    def __call__(self, request):
+        if (not tracemalloc.is_tracing()
+                or not self.pattern.match(request.path)):
+            return self.get_response(request)
+        before = memory.begin_request()
+        response = self.get_response(request)
+        memory.end_request(request, before)
+        return response
+
+
+class DuplicateQueryMiddleware:
+    """Ищет повторяющиеся запросы к базе в каждом запросе к API
+    при QUERY_INSPECTOR: пишет их в лог или, при QUERY_INSPECTOR_RAISE,
+    завершает запрос ошибкой DuplicateQueriesError.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inspector = QueryInspector()
+        with inspector.inspect():
+            response = self.get_response(request)
+        inspector.check(f'{request.method} {request.get_full_path()}',
+                        settings.QUERY_INSPECTOR_RAISE)
+        return response
@@ -1,6 +1,12 @@
-from rest_framework import mixins, viewsets
+from django.conf import settings
 
+from rest_framework import mixins, response, viewsets
+from rest_framework.settings import api_settings
+
+from . import coalescing
+from .catalog import get_snapshot
 from .permissions import IsAdminOrReadOnly
+from .serializers import sparse_fields
 
 
 class ListCreateDeleteViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
@@ -12,3 +18,84 @@ class ListCreateDeleteViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
     permission_classes = (IsAdminOrReadOnly,)
     search_fields = ('name',)
     lookup_field = 'slug'
+    snapshot_field = None
+
+    def list(self, request, *args, **kwargs):
+        """Список читается из снимка каталога в памяти без запросов к БД.
+        Поиск по 'name' повторяет поведение SearchFilter.
+        """
+        items = getattr(get_snapshot(), self.snapshot_field)
+        search = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        terms = search.replace('\x00', '').replace(',', ' ').casefold().split()
+        if terms:
+            items = [
+                item for item in items
+                if all(term in item['name'].casefold() for term in terms)
+            ]
+        page = self.paginate_queryset(items)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return response.Response(items)
+
+
+class AsyncDestroyMixin:
+    """Отложенное удаление объектов с большим каскадом.
+    При включенной настройке ASYNC_DELETE объект только помечается
+    к удалению, связанные записи удаляет команда purge_deleted.
+    """
+
+    def perform_destroy(self, instance):
+        if not settings.ASYNC_DELETE:
+            return super().perform_destroy(instance)
+        return instance.mark_deleted()
+
+
+class CoalescedReadMixin:
+    """Кеширование и объединение одинаковых запросов чтения
+    для страниц произведения, которые пересчитываются сотнями
+    запросов разом после нового отзыва или правки.
+    Данные зависят только от адреса, поэтому общие для всех
+    пользователей; права проверяются в каждом запросе как обычно.
+    """
+    coalesce_actions = ()
+    coalesce_title_kwarg = 'pk'
+
+    def coalesced(self, handler, request, *args, **kwargs):
+        if (self.action not in self.coalesce_actions
+                or not settings.COALESCE_TTL
+                or not self.kwargs[self.coalesce_title_kwarg].isdecimal()):
+            return handler(request, *args, **kwargs)
+        # /titles/05/ и /titles/5/ зависят от одной версии произведения.
+        data = coalescing.fetch(
+            request.build_absolute_uri(),
+            coalescing.title_versions(
+                int(self.kwargs[self.coalesce_title_kwarg])),
+            lambda: handler(request, *args, **kwargs).data
+        )
+        return response.Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.coalesced(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.coalesced(super().retrieve, request, *args, **kwargs)
+
+
+class SparseQuerysetMixin:
+    """Запрос только за полями ответа, выбранными параметрами ?fields=
+    и ?omit=: столбцы из sparse_columns (поле ответа -> столбец)
+    для невыбранных полей откладываются. Связи и аннотации вьюсет
+    добавляет сам по get_sparse_fields.
+    """
+    sparse_columns = {}
+
+    def get_sparse_fields(self):
+        return sparse_fields(
+            self.request, self.get_serializer_class().Meta.fields)
+
+    def sparse_queryset(self, queryset, fields):
+        deferred = [
+            column for field, column in self.sparse_columns.items()
+            if field not in fields
+        ]
+        return queryset.defer(*deferred) if deferred else queryset
@@ -0,0 +1,95 @@
+from django.db import transaction
+
+from reviews import stats
+from reviews.models import Change, Comment, Review
+from reviews.signals import CHANGE_PARENTS
+
+from .coalescing import invalidate_titles
+
+DELETE = 'delete'
+HIDE = 'hide'
+COUNT_KEYS = {Review: 'reviews', Comment: 'comments'}
+
+
+def review_queryset(filters):
+    queryset = Review.objects.all()
+    if 'author' in filters:
+        queryset = queryset.filter(author=filters['author'])
+    if 'title' in filters:
+        queryset = queryset.filter(title=filters['title'])
+    return queryset
+
+
+def comment_queryset(filters):
+    queryset = Comment.objects.all()
+    if 'author' in filters:
+        queryset = queryset.filter(author=filters['author'])
+    if 'title' in filters:
+        queryset = queryset.filter(review__title=filters['title'])
+    return queryset
+
+
+def apply(queryset, action):
+    """Удаляет или скрывает строки выборки одним запросом без сигналов,
+    записывает их в журнал изменений одной вставкой
+    и снимает видимые отзывы со статистики каталога.
+    Возвращает количество строк.
+    """
+    model = queryset.model
+    model_name = model._meta.model_name
+    rows = list(queryset.values_list('pk', CHANGE_PARENTS[model_name]))
+    if model is Review:
+        stats.apply_reviews(queryset.filter(stats.VISIBLE), -1)
+        invalidate_titles(title_id for _, title_id in rows)
+    if action == HIDE:
+        queryset.update(is_hidden=True)
+    else:
+        queryset._raw_delete(queryset.db)
+    Change.objects.bulk_create(
+        Change(model=model_name, object_id=pk, parent_id=parent_id,
+               action=Change.DELETE)
+        for pk, parent_id in rows
+    )
+    return len(rows)
+
+
+def moderate(queryset, action, batch_size, counts):
+    """Удаляет или скрывает записи выборки пачками по batch_size,
+    каждая пачка в отдельной короткой транзакции.
+    Вместе с пачкой отзывов удаляются их комментарии.
+    """
+    model = queryset.model
+    if action == HIDE:
+        queryset = queryset.filter(is_hidden=False)
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.select_for_update(of=('self',)).values_list(
+                'pk', flat=True)[:batch_size])
+            if not pks:
+                return counts
+            if action == DELETE and model is Review:
+                counts['comments'] += apply(
+                    Comment.objects.filter(review_id__in=pks), action)
+            counts[COUNT_KEYS[model]] += apply(
+                model.objects.filter(pk__in=pks), action)
+
+
+def moderate_bulk(data, batch_size):
+    """Применяет действие к отзывам и комментариям по фильтрам
+    ModerationSerializer и возвращает количество затронутых записей.
+    """
+    counts = {'reviews': 0, 'comments': 0}
+    querysets = []
+    if data['target'] in ('reviews', 'all'):
+        querysets.append(review_queryset(data))
+    if data['target'] in ('comments', 'all'):
+        querysets.append(comment_queryset(data))
+    for queryset in querysets:
+        if 'since' in data:
+            queryset = queryset.filter(pub_date__gte=data['since'])
+        if 'until' in data:
+            queryset = queryset.filter(pub_date__lt=data['until'])
+        if 'ids' in data:
+            queryset = queryset.filter(pk__in=data['ids'])
+        moderate(queryset, data['action'], batch_size, counts)
+    return counts
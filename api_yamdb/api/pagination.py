@@ -0,0 +1,159 @@
+import base64
+import binascii
+import heapq
+import json
+from collections import OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import exceptions, pagination, response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Постраничный вывод по ключу вместо OFFSET.
+    Курсор хранит значения полей сортировки последней записи страницы,
+    следующая страница выбирается условием по этим значениям,
+    поэтому стоимость запроса не растет с номером страницы.
+    Последним полем ordering должен быть уникальный ключ.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    cursor_query_param = 'cursor'
+    ordering = ('pk',)
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(cursor))
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def keyset_filter(self, values):
+        """Условие "строго после курсора" для составного ключа."""
+        condition, equal = Q(), Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (binascii.Error, ValueError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, field.lstrip('-'))
+                  for field in self.ordering]
+        encoded = json.dumps(values, default=str).encode()
+        return base64.urlsafe_b64encode(encoded).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return response.Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class UserSearchPagination(KeysetPagination):
+    """Вывод результатов поиска пользователей по убыванию релевантности."""
+    ordering = ('-rank', 'pk')
+
+
+class ActivityPagination(KeysetPagination):
+    """Постраничный вывод ленты из нескольких таблиц по убыванию даты.
+    Каждая таблица читается по индексу (author, pub_date) не дальше
+    курсора и не больше одной страницы, страницы сливаются в памяти.
+    При равной дате порядок задается номером таблицы и pk.
+    """
+    ordering = ('-pub_date', '-activity_rank', '-pk')
+
+    def after(self, rank, cursor):
+        """Условие "строго после курсора" для таблицы с номером rank."""
+        pub_date, cursor_rank, pk = cursor
+        if rank < cursor_rank:
+            return Q(pub_date__lte=pub_date)
+        if rank > cursor_rank:
+            return Q(pub_date__lt=pub_date)
+        return Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+
+    def paginate_querysets(self, querysets, request):
+        self.request = request
+        cursor = self.decode_cursor(request)
+        parts = []
+        for rank, queryset in enumerate(querysets):
+            if cursor is not None:
+                queryset = queryset.filter(self.after(rank, cursor))
+            items = list(
+                queryset.order_by('-pub_date', '-pk')[:self.page_size + 1])
+            for item in items:
+                item.activity_rank = rank
+            parts.append(items)
+        merged = heapq.merge(
+            *parts,
+            key=lambda item: (item.pub_date, item.activity_rank, item.pk),
+            reverse=True
+        )
+        page = list(islice(merged, self.page_size + 1))
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+
+class ChangeFeedPagination(KeysetPagination):
+    """Пачки журнала изменений по возрастанию номера записи.
+    Курсор возвращается всегда, даже для пустой пачки:
+    потребитель сохраняет его и передает в since при следующем опросе.
+    """
+    page_size = settings.CHANGE_FEED_BATCH_SIZE
+    cursor_query_param = 'since'
+    ordering = ('txid', 'pk')
+
+    def decode_cursor(self, request):
+        """Курсоры из одного номера записи выданы до появления txid,
+        все такие записи имеют txid 0.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is not None:
+            try:
+                values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            except (binascii.Error, ValueError):
+                values = None
+            if isinstance(values, list) and len(values) == 1:
+                return [0, values[0]]
+        return super().decode_cursor(request)
+
+    def get_cursor(self):
+        if self.page:
+            return self.encode_cursor(self.page[-1])
+        return self.request.query_params.get(self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return response.Response(OrderedDict([
+            ('cursor', self.get_cursor()),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -13,6 +13,19 @@ class IsAdmin(permissions.BasePermission):
                 )
 
 
+class IsModerator(permissions.BasePermission):
+    """Права модератора или администратора."""
+
+    message = 'Недостаточно прав, вы не модератор!'
+
+    def has_permission(self, request, view):
+        return (request.user.is_authenticated
+                and (request.user.is_superuser
+                     or request.user.is_admin
+                     or request.user.is_moderator)
+                )
+
+
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Права администратора или только чтение."""
 
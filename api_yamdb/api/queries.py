@@ -0,0 +1,140 @@
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import Serializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Служебные запросы транзакций отличаются только именем точки сохранения.
+IGNORED_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+VALUES_LISTS = re.compile(r'(VALUES \(\.\.\.\))(?:, \(\.\.\.\))+')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SPACES = re.compile(r'\s+')
+SELECT_LIST = re.compile(r'^SELECT (DISTINCT )?.+? FROM ')
+SERIALIZER_CODE = Serializer.to_representation.__code__
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(API_DIR)
+# Кадры самого инспектора и точки входа не указывают на источник запроса.
+SKIPPED_FILES = tuple(
+    os.path.join(API_DIR, name)
+    for name in ('queries.py', 'middleware.py', 'testing.py')
+) + (os.path.join(PROJECT_DIR, 'manage.py'),)
+
+_state = threading.local()
+
+
+class DuplicateQueriesError(Exception):
+    pass
+
+
+def normalize(sql):
+    """Запрос без значений: литералы заменяются на ?,
+    списки параметров любой длины сворачиваются в (...).
+    """
+    sql = SPACES.sub(' ', LITERALS.sub('?', sql)).strip()
+    sql = PLACEHOLDER_LISTS.sub('(...)', sql)
+    sql = sql.replace('(%s)', '(...)').replace('(?)', '(...)')
+    return VALUES_LISTS.sub(r'\1', sql)
+
+
+def origin():
+    """Откуда выполнен запрос: поле сериализатора, при выводе которого
+    он сделан, метод представления и ближайшая строка кода проекта.
+    """
+    field = view = line = None
+    frame = sys._getframe(2)
+    while frame is not None and (view is None or line is None):
+        code = frame.f_code
+        if field is None and code is SERIALIZER_CODE:
+            serializer_field = frame.f_locals.get('field')
+            if serializer_field is not None:
+                field = (f'{type(frame.f_locals["self"]).__name__}.'
+                         f'{serializer_field.field_name}')
+        # type() вместо isinstance: isinstance у ленивых объектов
+        # вычисляет их и выполняет новые запросы.
+        if (view is None and code.co_varnames[:1] == ('self',)
+                and issubclass(type(frame.f_locals.get('self')), APIView)):
+            view = f'{type(frame.f_locals["self"]).__name__}.{code.co_name}'
+        if (line is None and code.co_filename.startswith(PROJECT_DIR)
+                and code.co_filename not in SKIPPED_FILES
+                and 'site-packages' not in code.co_filename):
+            path = os.path.relpath(code.co_filename, PROJECT_DIR)
+            line = f'{path}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return ' <- '.join(place for place in (field, view, line) if place)
+
+
+class QueryInspector:
+    """Собирает запросы ко всем базам, сгруппированные
+    по нормализованному тексту, и находит повторяющиеся:
+    N+1 и одинаковые запросы, различающиеся только параметрами.
+    Вложенный инспектор (middleware внутри теста) забирает
+    запросы себе, и внешний их не видит.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.QUERY_DUPLICATE_THRESHOLD
+        self.queries = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        if (getattr(_state, 'inspector', None) is self
+                and not sql.startswith(IGNORED_STATEMENTS)):
+            self.queries[normalize(sql)][origin()] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def inspect(self):
+        outer = getattr(_state, 'inspector', None)
+        _state.inspector = self
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self))
+                yield self
+        finally:
+            _state.inspector = outer
+
+    @property
+    def count(self):
+        return sum(sum(places.values()) for places in self.queries.values())
+
+    def duplicates(self):
+        """Запросы, выполненные не меньше threshold раз,
+        от самых частых к редким.
+        """
+        repeated = [
+            (sql, places) for sql, places in self.queries.items()
+            if sum(places.values()) >= self.threshold
+        ]
+        return sorted(repeated, key=lambda item: -sum(item[1].values()))
+
+    def report(self, label):
+        lines = [f'{label}: {self.count} запросов, повторяются:']
+        for sql, places in self.duplicates():
+            short_sql = SELECT_LIST.sub(r'SELECT \1... FROM ', sql)
+            lines.append(f'{sum(places.values())} x {short_sql}')
+            lines.extend(
+                f'    {count} x {place or "вне кода проекта"}'
+                for place, count in places.most_common()
+            )
+        return '\n'.join(lines)
+
+    def check(self, label, raise_error=False):
+        """Сообщает о повторяющихся запросах: исключением
+        DuplicateQueriesError или предупреждением в лог.
+        """
+        if not self.duplicates():
+            return
+        report = self.report(label)
+        if raise_error:
+            raise DuplicateQueriesError(report)
+        logger.warning(report)
@@ -1,11 +1,54 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db.models import Q
 
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework_simplejwt.tokens import AccessToken
 
 from reviews.models import (User, Category, Genre,
-                            GenreTitle, Title, Review, Comment)
+                            Title, Review, Comment, Change,
+                            SimilarTitle, CatalogStat)
+from users.validators import validate_username
+from .catalog import get_snapshot
+
+
+def sparse_fields(request, fields):
+    """Поля ответа с учетом параметров ?fields= (оставить перечисленные)
+    и ?omit= (исключить перечисленные). Без параметров и в запросах
+    записи возвращаются все поля.
+    """
+    fields = tuple(fields)
+    if request is None or request.method not in SAFE_METHODS:
+        return fields
+    for param in ('fields', 'omit'):
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names.difference(fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {param: f'Неизвестные поля: {", ".join(sorted(unknown))}.'})
+        fields = tuple(
+            name for name in fields if (name in names) == (param == 'fields'))
+    return fields
+
+
+class SparseFieldsMixin:
+    """Сериализатор с выбором полей ответа параметрами ?fields=
+    и ?omit=. Вложенный сериализатор выводит все свои поля.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if isinstance(self.parent, serializers.Serializer):
+            return fields
+        return {
+            name: fields[name] for name
+            in sparse_fields(self.context.get('request'), fields)
+        }
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -15,17 +58,39 @@ class UserCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('email', 'username')
+        extra_kwargs = {
+            'username': {'validators': (validate_username,)},
+            'email': {'validators': ()},
+        }
 
     def validate(self, attrs):
-        """Проверка уникальности полей и ввода недопустимого имени 'me'."""
-        if attrs.get('username') == 'me':
+        """Проверка уникальности полей и ввода недопустимого имени 'me'.
+        Уникальность проверяется одним запросом, найденный пользователь
+        с той же парой username и email возвращается в поле 'user'.
+        """
+        username = attrs.get('username')
+        email = attrs.get('email')
+        if username == 'me':
             raise serializers.ValidationError(
                 'Поле username не может быть "me".'
             )
-        if attrs.get('username') == attrs.get('email'):
+        if username == email:
             raise serializers.ValidationError(
                 'Поля email и username не должны совпадать.'
             )
+        users = User.objects.filter(Q(username=username) | Q(email=email))
+        errors = {}
+        for user in users[:2]:
+            if user.username == username and user.email == email:
+                attrs['user'] = user
+                return attrs
+            if user.username == username:
+                errors['username'] = 'Этот username уже занят.'
+            if user.email == email:
+                errors['email'] = 'Этот email уже занят.'
+        if errors:
+            raise serializers.ValidationError(errors)
+        attrs['user'] = None
         return attrs
 
 
@@ -47,15 +112,17 @@ class CustomTokenObtainSerializer(serializers.ModelSerializer):
         return {'access': str(access), }
 
     def validate(self, attrs):
-        username = attrs.get('username')
-        confirmation_code = attrs.get('confirmation_code')
-        user = get_object_or_404(User, username=username)
-        if confirmation_code != str(user.confirmation_code):
+        """Проверка хеша и срока действия кода.
+        Найденный пользователь возвращается в поле 'user'.
+        """
+        user = get_object_or_404(User, username=attrs.get('username'))
+        if not user.check_confirmation_code(attrs.get('confirmation_code')):
             raise serializers.ValidationError('Ошибка ввода данных')
+        attrs['user'] = user
         return attrs
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для изменения данных пользователя."""
 
     class Meta:
@@ -84,13 +151,32 @@ class GenreSerializer(serializers.ModelSerializer):
         model = Genre
 
 
+class CatalogSlugField(serializers.SlugRelatedField):
+    """Поле выбора категории или жанра по slug.
+    Slug проверяется по снимку каталога в памяти, объект создается
+    без запроса к БД. При промахе снимка выполняется обычный запрос.
+    """
+
+    def __init__(self, snapshot_field, **kwargs):
+        self.snapshot_field = snapshot_field
+        super().__init__(slug_field='slug', **kwargs)
+
+    def to_internal_value(self, data):
+        ids = getattr(get_snapshot(), self.snapshot_field)
+        if isinstance(data, str) and data in ids:
+            queryset = self.get_queryset()
+            return queryset.model.from_db(
+                queryset.db, ('id', 'slug'), (ids[data], data))
+        return super().to_internal_value(data)
+
+
 class WriteTitleSerializer(serializers.ModelSerializer):
     """Сериализатор произведений для запросов записи."""
-    category = serializers.SlugRelatedField(
-        slug_field='slug', queryset=Category.objects.all()
+    category = CatalogSlugField(
+        'category_ids', queryset=Category.objects.all()
     )
-    genre = serializers.SlugRelatedField(
-        slug_field='slug', queryset=Genre.objects.all(), many=True
+    genre = CatalogSlugField(
+        'genre_ids', queryset=Genre.objects.all(), many=True
     )
 
     class Meta:
@@ -101,14 +187,11 @@ class WriteTitleSerializer(serializers.ModelSerializer):
         """Добавление связи произведение-жанр (many-to-many)."""
         genres = validated_data.pop('genre')
         title = Title.objects.create(**validated_data)
-
-        for genre in genres:
-            GenreTitle.objects.create(title=title, genre=genre)
-
+        title.genre.add(*genres)
         return title
 
 
-class ReadTitleSerializer(serializers.ModelSerializer):
+class ReadTitleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор произведений для запросов чтения."""
     category = CategorySerializer(read_only=True,)
     genre = GenreSerializer(read_only=True, many=True)
@@ -122,7 +205,7 @@ class ReadTitleSerializer(serializers.ModelSerializer):
         model = Title
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериалайзер для модели Comment."""
     author = serializers.SlugRelatedField(
         read_only=True, slug_field='username'
@@ -133,7 +216,7 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для модели Review."""
     author = serializers.SlugRelatedField(
         read_only=True, slug_field='username'
@@ -159,3 +242,100 @@ class ReviewSerializer(serializers.ModelSerializer):
                 'Вы уже оставили свой отзыв на это произведение!'
             )
         return data
+
+
+class ActivitySerializer(serializers.Serializer):
+    """Сериализатор ленты активности: отзывы и комментарии пользователя."""
+    type = serializers.SerializerMethodField()
+    id = serializers.IntegerField()
+    text = serializers.CharField()
+    score = serializers.SerializerMethodField()
+    pub_date = serializers.DateTimeField()
+    title = serializers.SerializerMethodField()
+    review = serializers.SerializerMethodField()
+
+    def get_type(self, obj):
+        return 'review' if isinstance(obj, Review) else 'comment'
+
+    def get_score(self, obj):
+        return getattr(obj, 'score', None)
+
+    def get_title(self, obj):
+        title = obj.title if isinstance(obj, Review) else obj.review.title
+        return {'id': title.pk, 'name': title.name}
+
+    def get_review(self, obj):
+        return None if isinstance(obj, Review) else obj.review_id
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """Сериализатор записи журнала изменений."""
+    class Meta:
+        model = Change
+        fields = (
+            'id', 'model', 'object_id', 'parent_id', 'action', 'changed_at'
+        )
+
+
+class SimilarTitleSerializer(serializers.ModelSerializer):
+    """Сериализатор похожего произведения со степенью сходства."""
+    id = serializers.IntegerField(source='similar_id')
+    name = serializers.CharField(source='similar.name')
+    year = serializers.IntegerField(source='similar.year')
+
+    class Meta:
+        model = SimilarTitle
+        fields = ('id', 'name', 'year', 'score')
+
+
+class ModerationSerializer(serializers.Serializer):
+    """Параметры массовой модерации отзывов и комментариев.
+    Фильтры объединяются через AND, нужен хотя бы один из них.
+    """
+    action = serializers.ChoiceField(choices=('delete', 'hide'))
+    target = serializers.ChoiceField(
+        choices=('reviews', 'comments', 'all'), default='all')
+    author = serializers.SlugRelatedField(
+        slug_field='username', queryset=User.objects.all(), required=False)
+    title = serializers.PrimaryKeyRelatedField(
+        queryset=Title.objects.all(), required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MODERATION_MAX_IDS,
+        required=False
+    )
+
+    def validate(self, data):
+        if not data.keys() & {'author', 'title', 'since', 'until', 'ids'}:
+            raise serializers.ValidationError(
+                'Укажите хотя бы один фильтр: author, title, since, '
+                'until или ids.'
+            )
+        if 'ids' in data and data['target'] == 'all':
+            raise serializers.ValidationError(
+                'Список ids относится к одной модели: '
+                'укажите target reviews или comments.'
+            )
+        return data
+
+
+class CatalogStatSerializer(serializers.ModelSerializer):
+    """Сводка по категории или жанру."""
+    rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        fields = ('slug', 'name', 'titles', 'reviews', 'rating')
+        model = CatalogStat
+
+
+class YearStatSerializer(serializers.ModelSerializer):
+    """Сводка по году выпуска."""
+    year = serializers.IntegerField(source='key')
+    rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        fields = ('year', 'titles', 'reviews', 'rating')
+        model = CatalogStat
@@ -0,0 +1,29 @@
+import pytest
+
+from .queries import QueryInspector
+
+
+@pytest.fixture
+def query_inspector(request, settings):
+    """Проваливает тест, если в нем повторяются запросы к базе.
+    Запросы к API через тестовый клиент проверяются по отдельности
+    DuplicateQueryMiddleware, остальной код теста - целиком.
+    Порог можно задать маркером: @pytest.mark.query_threshold(5).
+    """
+    marker = request.node.get_closest_marker('query_threshold')
+    if marker is not None:
+        settings.QUERY_DUPLICATE_THRESHOLD = marker.args[0]
+    settings.QUERY_INSPECTOR = True
+    settings.QUERY_INSPECTOR_RAISE = True
+    inspector = QueryInspector()
+    with inspector.inspect():
+        yield inspector
+    if inspector.duplicates():
+        pytest.fail(inspector.report(request.node.nodeid), pytrace=False)
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'query_threshold(count): порог повторов для query_inspector'
+    )
@@ -3,8 +3,10 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (UserViewSet, UserCreateViewSet, CategoryViewSet,
-                    GenreViewSet, CustomTokenObtain, TitleViewSet,
-                    ReviewViewSet, CommentViewSet)
+                    GenreViewSet, CustomTokenObtain, TokenRevoke,
+                    TitleViewSet, ReviewViewSet, CommentViewSet, ChangeFeed,
+                    BulkModeration, MemoryProfile, MemorySnapshots,
+                    MemorySnapshotDiff, CatalogStats)
 
 app_name = 'api'
 
@@ -28,5 +30,15 @@ v1_router.register(
 urlpatterns = [
     path('v1/auth/signup/', UserCreateViewSet.as_view()),
     path('v1/auth/token/', CustomTokenObtain.as_view()),
+    path('v1/auth/revoke/', TokenRevoke.as_view()),
+    path('v1/changes/', ChangeFeed.as_view()),
+    path('v1/moderation/', BulkModeration.as_view()),
+    path('v1/stats/', CatalogStats.as_view()),
+    path('v1/memory/', MemoryProfile.as_view()),
+    path('v1/memory/snapshots/', MemorySnapshots.as_view()),
+    path(
+        'v1/memory/snapshots/<str:first>/<str:second>/',
+        MemorySnapshotDiff.as_view()
+    ),
     path('v1/', include(v1_router.urls)),
 ]
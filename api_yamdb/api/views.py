@@ -2,22 +2,34 @@ from http import HTTPStatus
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models import Avg
+from django.db import IntegrityError
+from django.db.models import Avg, Q
 
-from rest_framework import (filters, generics, response, viewsets)
+from rest_framework import generics, response, views, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
-
-from .filters import TitleFilter
-from .mixins import ListCreateDeleteViewSet
-from .permissions import (IsAdmin, IsAdminOrReadOnly,
+from rest_framework.settings import api_settings
+
+from . import autocomplete, memory
+from .filters import TitleFilter, UserSearchFilter
+from .mixins import (AsyncDestroyMixin, CoalescedReadMixin,
+                     ListCreateDeleteViewSet, SparseQuerysetMixin)
+from .moderation import moderate_bulk
+from .pagination import (ActivityPagination, ChangeFeedPagination,
+                         UserSearchPagination)
+from .permissions import (IsAdmin, IsAdminOrReadOnly, IsModerator,
                           IsAuthorAdminModeratorOrReadOnly)
 from .serializers import (
     UserCreateSerializer, CustomTokenObtainSerializer, UserSerializer,
     CategorySerializer, GenreSerializer, ReadTitleSerializer,
-    WriteTitleSerializer, ReviewSerializer, CommentSerializer
+    WriteTitleSerializer, ReviewSerializer, CommentSerializer,
+    ActivitySerializer, ChangeSerializer, SimilarTitleSerializer,
+    ModerationSerializer, CatalogStatSerializer, YearStatSerializer
 )
-from reviews.models import User, Category, Genre, Title, Review
+from reviews.models import (User, Category, Genre, Title, Review, Comment,
+                            Change, SimilarTitle, CatalogStat)
+from users.revocation import denylist
 
 
 ALLOWED_METHODS = ('get', 'post', 'patch', 'delete')
@@ -25,26 +37,33 @@ ALLOWED_METHODS = ('get', 'post', 'patch', 'delete')
 
 class UserCreateViewSet(generics.CreateAPIView):
     """Представление для создания пользователя. Имеет только POST запрос.
+    Выполняет один запрос на поиск пользователя и одну запись:
+    создание пользователя или обновление кода подтверждения.
     """
     permission_classes = (AllowAny,)
     serializer_class = UserCreateSerializer
     queryset = User.objects.all()
 
     def post(self, request, *args, **kwargs):
-
-        email = request.data.get('email')
-        username = request.data.get('username')
-
-        if User.objects.filter(email=email, username=username).exists():
-            user = User.objects.get(email=email, username=username)
+        serializer = UserCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data.pop('user')
+
+        if user is None:
+            user = User(**serializer.validated_data)
+            code = user.set_confirmation_code()
+            try:
+                user.save()
+            except IntegrityError:
+                raise ValidationError('Пользователь уже существует.')
         else:
-            serializer = UserCreateSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            user = User.objects.create(**serializer.validated_data)
+            code = user.set_confirmation_code()
+            user.save(update_fields=(
+                'confirmation_code', 'confirmation_code_expires'))
 
         send_mail(
             subject='YaMDb регистрация',
-            message=f'confirmation_code: {user.confirmation_code}',
+            message=f'confirmation_code: {code}',
             from_email=settings.POST_EMAIL,
             recipient_list=[user.email],
         )
@@ -53,6 +72,7 @@ class UserCreateViewSet(generics.CreateAPIView):
 
 class CustomTokenObtain(generics.CreateAPIView):
     """Представление для создания JWT токена. Имеет только POST запрос.
+    Код подтверждения одноразовый: после выдачи токена он сбрасывается.
     """
     permission_classes = (AllowAny,)
     serializer_class = CustomTokenObtainSerializer
@@ -61,10 +81,12 @@ class CustomTokenObtain(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         serializer = CustomTokenObtainSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = get_object_or_404(
-            User,
-            username=serializer.data['username']
-        )
+        user = serializer.validated_data['user']
+        used = User.objects.filter(
+            pk=user.pk, confirmation_code=user.confirmation_code
+        ).update(confirmation_code='', confirmation_code_expires=None)
+        if not used:
+            raise ValidationError('Ошибка ввода данных')
         token = serializer.get_token(user)
         return response.Response(
             {'token': f"{ token['access'] }"},
@@ -72,19 +94,62 @@ class CustomTokenObtain(generics.CreateAPIView):
         )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class TokenRevoke(views.APIView):
+    """Отзыв текущего JWT токена пользователя. Имеет только POST запрос.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        denylist.revoke_token(request.auth)
+        return response.Response(status=HTTPStatus.NO_CONTENT)
+
+
+class UserViewSet(SparseQuerysetMixin, AsyncDestroyMixin,
+                  viewsets.ModelViewSet):
     """Вьюсет Пользователя.
     Реализованы методы чтения, создания,
     частичного обновления и удаления объектов.
-    Есть поиск по полю username.
+    Есть поиск по полям username и email с ранжированием
+    и постраничным выводом по ключу.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_deleted=False)
     serializer_class = UserSerializer
     permission_classes = (IsAdmin,)
     lookup_field = 'username'
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('username',)
+    filter_backends = (UserSearchFilter,)
     http_method_names = ALLOWED_METHODS
+    sparse_columns = {
+        field: field for field in UserSerializer.Meta.fields
+    }
+
+    def get_queryset(self):
+        return self.sparse_queryset(
+            super().get_queryset(), self.get_sparse_fields())
+
+    @property
+    def paginator(self):
+        """Результаты поиска выводятся по релевантности, остальные
+        списки - классом постраничного вывода по умолчанию.
+        """
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if (self.request is not None and self.request.query_params.get(
+                    api_settings.SEARCH_PARAM)):
+                pagination_class = UserSearchPagination
+            self._paginator = (
+                None if pagination_class is None else pagination_class())
+        return self._paginator
+
+    @action(
+        detail=True,
+        methods=['post'],
+        url_path='revoke-tokens',
+        url_name='revoke-tokens',
+    )
+    def revoke_tokens(self, request, username=None):
+        """Отзыв всех выданных пользователю токенов."""
+        denylist.revoke_user(self.get_object())
+        return response.Response(status=HTTPStatus.NO_CONTENT)
 
     @action(
         detail=False,
@@ -109,44 +174,137 @@ class UserViewSet(viewsets.ModelViewSet):
             )
         return response.Response(serializer.data, status=HTTPStatus.OK)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='me/activity',
+        url_name='me-activity',
+        permission_classes=(IsAuthenticated,),
+    )
+    def activity(self, request):
+        """Отзывы и комментарии пользователя по '/users/me/activity/'.
+        Страница собирается двумя запросами независимо от ее номера.
+        """
+        paginator = ActivityPagination()
+        page = paginator.paginate_querysets((
+            Comment.objects.filter(
+                author=request.user, is_hidden=False,
+                review__is_hidden=False, review__title__is_deleted=False
+            ).select_related('review__title').only(
+                'id', 'text', 'pub_date', 'review__id',
+                'review__title__id', 'review__title__name'),
+            Review.objects.filter(
+                author=request.user, is_hidden=False, title__is_deleted=False
+            ).select_related('title').only(
+                'id', 'text', 'score', 'pub_date',
+                'title__id', 'title__name'),
+        ), request)
+        serializer = ActivitySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 
 class CategoryViewSet(ListCreateDeleteViewSet):
     """Вьюсет для категорий."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    snapshot_field = 'categories'
 
 
 class GenreViewSet(ListCreateDeleteViewSet):
     """Вьюсет для жанров."""
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
+    snapshot_field = 'genres'
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(SparseQuerysetMixin, CoalescedReadMixin,
+                   AsyncDestroyMixin, viewsets.ModelViewSet):
     """Вьюсет для произведений."""
-    queryset = (Title.objects.all().
-                annotate(rating=Avg('reviews__score')).order_by('pk'))
+    queryset = Title.objects.filter(is_deleted=False).order_by('pk')
     permission_classes = (IsAdminOrReadOnly,)
     filterset_class = TitleFilter
+    coalesce_actions = ('retrieve',)
+    sparse_columns = {
+        'name': 'name', 'year': 'year', 'description': 'description',
+        'category': 'category',
+    }
 
     def get_queryset(self):
-        return super().get_queryset()
+        """Категория, жанры и рейтинг загружаются, только если
+        они попадут в ответ.
+        """
+        fields = self.get_sparse_fields()
+        queryset = self.sparse_queryset(super().get_queryset(), fields)
+        if 'category' in fields:
+            queryset = queryset.select_related('category')
+        if 'genre' in fields:
+            queryset = queryset.prefetch_related('genre')
+        if 'rating' in fields:
+            queryset = queryset.annotate(rating=Avg(
+                'reviews__score',
+                filter=Q(reviews__author__is_deleted=False,
+                         reviews__is_hidden=False)
+            ))
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return ReadTitleSerializer
         return WriteTitleSerializer
 
+    @action(detail=True, methods=('get',), filter_backends=(),
+            pagination_class=None)
+    def similar(self, request, pk=None):
+        """Похожие произведения одним чтением по индексу (title, -score).
+        Списки заранее строит команда build_similar_titles.
+        """
+        generics.get_object_or_404(
+            Title.objects.filter(is_deleted=False).only('pk'), pk=pk)
+        neighbors = (
+            SimilarTitle.objects
+            .filter(title_id=pk, similar__is_deleted=False)
+            .select_related('similar')
+            .only('score', 'similar', 'similar__name', 'similar__year')
+            .order_by('-score')
+        )
+        serializer = SimilarTitleSerializer(neighbors, many=True)
+        return response.Response(serializer.data)
+
+    @action(detail=False, methods=('get',), filter_backends=(),
+            pagination_class=None)
+    def autocomplete(self, request):
+        """Подсказки по началу любого слова названия: '?q=мас'.
+        Ищет по индексу в памяти воркера без запросов к базе,
+        популярные произведения первыми.
+        """
+        limit = request.query_params.get('limit', settings.AUTOCOMPLETE_LIMIT)
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({'limit': 'Ожидается целое число.'})
+        if not 0 < limit <= settings.AUTOCOMPLETE_MAX_LIMIT:
+            raise ValidationError({'limit': (
+                f'Допустимо от 1 до {settings.AUTOCOMPLETE_MAX_LIMIT}.')})
+        return response.Response(
+            autocomplete.search(request.query_params.get('q', ''), limit))
+
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(SparseQuerysetMixin, CoalescedReadMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для Отзывов."""
     serializer_class = ReviewSerializer
     permission_classes = (IsAuthorAdminModeratorOrReadOnly,)
+    coalesce_actions = ('list',)
+    coalesce_title_kwarg = 'title_id'
+    sparse_columns = {
+        'text': 'text', 'score': 'score', 'author': 'author',
+        'pub_date': 'pub_date',
+    }
 
     def get_title(self):
         """Получение произведения по id."""
         title_id = self.kwargs.get('title_id')
-        return get_object_or_404(Title, pk=title_id)
+        return get_object_or_404(Title, pk=title_id, is_deleted=False)
 
     def perform_create(self, serializer):
         serializer.save(
@@ -154,18 +312,33 @@ class ReviewViewSet(viewsets.ModelViewSet):
             title=self.get_title())
 
     def get_queryset(self):
-        return self.get_title().reviews.all()
+        fields = self.get_sparse_fields()
+        queryset = self.sparse_queryset(self.get_title().reviews.filter(
+            author__is_deleted=False, is_hidden=False), fields)
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        return queryset
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     """Вьюсет для Комментариев."""
     serializer_class = CommentSerializer
     permission_classes = (IsAuthorAdminModeratorOrReadOnly,)
+    sparse_columns = {
+        'text': 'text', 'author': 'author', 'pub_date': 'pub_date',
+    }
 
     def get_review(self):
         """Получение отзыва по id."""
         review_id = self.kwargs.get('review_id')
-        return get_object_or_404(Review, pk=review_id)
+        return get_object_or_404(
+            Review,
+            pk=review_id,
+            title_id=self.kwargs.get('title_id'),
+            is_hidden=False,
+            title__is_deleted=False,
+            author__is_deleted=False
+        )
 
     def perform_create(self, serializer):
         serializer.save(
@@ -173,4 +346,124 @@ class CommentViewSet(viewsets.ModelViewSet):
             review=self.get_review())
 
     def get_queryset(self):
-        return self.get_review().comments.all()
+        fields = self.get_sparse_fields()
+        queryset = self.sparse_queryset(self.get_review().comments.filter(
+            author__is_deleted=False, is_hidden=False), fields)
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        return queryset
+
+
+class BulkModeration(views.APIView):
+    """Массовое удаление или скрытие отзывов и комментариев модератором.
+    Записи обрабатываются пачками по DELETE_BATCH_SIZE запросами
+    над множеством строк, без загрузки объектов и сигналов.
+    Рейтинг считается запросом по нескрытым отзывам и остается верным,
+    статистика каталога обновляется одним запросом на пачку.
+    """
+    permission_classes = (IsModerator,)
+
+    def post(self, request):
+        serializer = ModerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        counts = moderate_bulk(
+            serializer.validated_data, settings.DELETE_BATCH_SIZE)
+        return response.Response(counts)
+
+
+class ChangeFeed(generics.ListAPIView):
+    """Журнал изменений для инкрементальной синхронизации.
+    Отдает записи после курсора since пачками в порядке (txid, pk).
+    Записи незавершенных транзакций и все, что идет после них,
+    не отдаются, пока эти транзакции не завершатся: иначе потребитель
+    сдвинул бы курсор дальше и пропустил их записи.
+    """
+    serializer_class = ChangeSerializer
+    permission_classes = (IsAdmin,)
+    pagination_class = ChangeFeedPagination
+    filter_backends = ()
+
+    def get_queryset(self):
+        queryset = Change.objects.settled()
+        models = self.request.query_params.get('model')
+        if models:
+            queryset = queryset.filter(model__in=models.split(','))
+        return queryset
+
+
+class CatalogStats(views.APIView):
+    """Число произведений, видимых отзывов и средняя оценка
+    по категориям, жанрам и годам выпуска. Читается одним запросом
+    из сводной таблицы, которая обновляется при записи отзывов.
+    Параметр dimension=category,genre,year ограничивает разрезы.
+    """
+    permission_classes = (IsAdminOrReadOnly,)
+    sections = {
+        CatalogStat.CATEGORY: ('categories', CatalogStatSerializer),
+        CatalogStat.GENRE: ('genres', CatalogStatSerializer),
+        CatalogStat.YEAR: ('years', YearStatSerializer),
+    }
+
+    def get(self, request):
+        dimensions = request.query_params.get('dimension')
+        dimensions = (dimensions.split(',') if dimensions
+                      else list(self.sections))
+        unknown = set(dimensions) - self.sections.keys()
+        if unknown:
+            raise ValidationError(
+                {'dimension': f'Неизвестные разрезы: {", ".join(unknown)}.'})
+        groups = {dimension: [] for dimension in dimensions}
+        for stat in CatalogStat.objects.filter(
+                dimension__in=dimensions, titles__gt=0):
+            groups[stat.dimension].append(stat)
+        return response.Response({
+            self.sections[dimension][0]:
+                self.sections[dimension][1](stats, many=True).data
+            for dimension, stats in groups.items()
+        })
+
+
+class MemoryProfile(views.APIView):
+    """Память воркера, обработавшего запрос: RSS, трассировка tracemalloc,
+    число живых моделей и сериализаторов, пики по маршрутам
+    и список снимков. Каждый воркер gunicorn отвечает за себя.
+    """
+    permission_classes = (IsAdmin,)
+
+    def get(self, request):
+        return response.Response(memory.status())
+
+
+class MemorySnapshots(views.APIView):
+    """Снимок аллокаций воркера по запросу."""
+    permission_classes = (IsAdmin,)
+
+    def post(self, request):
+        snapshot_id = memory.take_snapshot()
+        return response.Response(
+            {'id': snapshot_id, 'snapshots': memory.list_snapshots()},
+            status=HTTPStatus.CREATED
+        )
+
+
+class MemorySnapshotDiff(views.APIView):
+    """Рост памяти между двумя снимками одного воркера,
+    сгруппированный по строке (group=lineno) или файлу (group=filename).
+    """
+    permission_classes = (IsAdmin,)
+
+    def get(self, request, first, second):
+        if first.split('-')[0] != second.split('-')[0]:
+            raise ValidationError('Снимки должны быть сняты в одном воркере.')
+        key_type = request.query_params.get('group', 'lineno')
+        if key_type not in ('lineno', 'filename'):
+            raise ValidationError('group: lineno или filename.')
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError('limit должен быть числом.')
+        snapshots = [memory.load_snapshot(first), memory.load_snapshot(second)]
+        if None in snapshots:
+            raise NotFound('Снимок не найден.')
+        return response.Response(
+            memory.compare(*snapshots, key_type, limit))
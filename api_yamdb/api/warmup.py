@@ -0,0 +1,40 @@
+from django.apps import apps
+from django.urls import URLResolver, get_resolver
+
+from . import autocomplete
+
+
+def _compile_patterns(patterns):
+    """Компилирует регулярные выражения всех маршрутов заранее."""
+    for pattern in patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile_patterns(pattern.url_patterns)
+
+
+def warm_up():
+    """Прогрев воркера до первого запроса.
+    Заполняет кэши, которые живут весь срок процесса: резолверы
+    и регулярные выражения URL, метаданные моделей, которые
+    сериализаторы и фильтры читают в каждом запросе, и индекс
+    подсказок названий. Поля сериализаторов и формы фильтров
+    DRF и django-filter строят заново для каждого экземпляра,
+    поэтому их прогрев ничего не экономит и не выполняется.
+    Индекс - единственное, что читается из базы; после него
+    соединения закрываются, поэтому прогрев безопасен
+    в мастер-процессе gunicorn перед fork.
+    """
+    resolver = get_resolver()
+    resolver.reverse_dict
+    _compile_patterns(resolver.url_patterns)
+
+    for model in apps.get_models():
+        opts = model._meta
+        opts.get_fields()
+        opts.fields
+        opts.many_to_many
+        opts.related_objects
+        opts.fields_map
+        opts.total_unique_constraints
+
+    autocomplete.warm_up()
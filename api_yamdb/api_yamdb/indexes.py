@@ -0,0 +1,13 @@
+from django.db import connections
+
+
+def create_indexes(using, statements):
+    """Выполняет операторы создания индексов, которые не выражаются
+    через Meta.indexes. statements - операторы по СУБД, например
+    {'postgresql': (...), 'sqlite': (...)}; для других СУБД
+    ничего не делается.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for statement in statements.get(connection.vendor, ()):
+            cursor.execute(statement)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 from django.core.management.utils import get_random_secret_key
@@ -33,12 +34,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.DuplicateQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.RequestMemoryMiddleware',
 ]
 
 ROOT_URLCONF = 'api_yamdb.urls'
@@ -62,6 +65,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'api_yamdb.wsgi.application'
 
+WARM_UP: bool = os.getenv('WARM_UP', default='True') == 'True'
+
 
 DATABASES = {
     'default': {
@@ -75,6 +80,20 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(BASE_DIR, 'cache')
+        ),
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -106,6 +125,39 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+STATICFILES_STORAGE = (
+    'api_yamdb.staticfiles.CompressedManifestStaticFilesStorage')
+
+SERVE_STATIC: bool = os.getenv('SERVE_STATIC', default='False') == 'True'
+
+MEMORY_PROFILING: bool = (
+    os.getenv('MEMORY_PROFILING', default='False') == 'True')
+
+MEMORY_PROFILE_FRAMES: int = int(
+    os.getenv('MEMORY_PROFILE_FRAMES', default='1'))
+
+MEMORY_PROFILE_PATH: str = os.getenv('MEMORY_PROFILE_PATH', default='')
+
+MEMORY_SNAPSHOT_DIR: str = os.getenv(
+    'MEMORY_SNAPSHOT_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'yamdb_memory')
+)
+
+QUERY_INSPECTOR: bool = (
+    os.getenv('QUERY_INSPECTOR', default='False') == 'True')
+
+QUERY_INSPECTOR_RAISE: bool = (
+    os.getenv('QUERY_INSPECTOR_RAISE', default='False') == 'True')
+
+QUERY_DUPLICATE_THRESHOLD: int = int(
+    os.getenv('QUERY_DUPLICATE_THRESHOLD', default='3'))
+
+COALESCE_TTL: int = int(os.getenv('COALESCE_TTL', default='30'))
+
+COALESCE_STALE_TTL: int = 600
+
+COALESCE_LOCK_TIMEOUT: int = 10
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -123,12 +175,36 @@ FIRST_BOOK_YEAR: int = 868
 
 GENRES_NUM_SHOW: int = 3
 
+ASYNC_DELETE: bool = os.getenv('ASYNC_DELETE', default='False') == 'True'
+
+DELETE_BATCH_SIZE: int = 1000
+
+MODERATION_MAX_IDS: int = 10000
+
+ADMIN_COUNT_ESTIMATE_FROM: int = 10000
+
+CHANGE_FEED_BATCH_SIZE: int = 500
+
+CHANGE_FEED_LAG = timedelta(seconds=5)
+
+SIMILAR_TITLES_TOP_K: int = 10
+
+AUTOCOMPLETE_LIMIT: int = 10
+
+AUTOCOMPLETE_MAX_LIMIT: int = 50
+
+AUTOCOMPLETE_CHECK_INTERVAL: float = 1.0
+
+AUTOCOMPLETE_SYNC_INTERVAL: int = 60
+
+AUTOCOMPLETE_REBUILD_INTERVAL: int = 3600
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RevocableJWTAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': (
         'rest_framework.filters.SearchFilter',
@@ -142,3 +218,15 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+
+CONFIRMATION_CODE_LIFETIME = timedelta(hours=24)
+
+CONFIRMATION_CODE_BYTES: int = 16
+
+REVOCATION_SYNC_INTERVAL: int = 5
+
+REVOCATION_REBUILD_INTERVAL: int = 3600
+
+REVOCATION_CAPACITY: int = 100000
+
+REVOCATION_ERROR_RATE: float = 0.001
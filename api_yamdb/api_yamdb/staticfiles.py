@@ -0,0 +1,125 @@
+import gzip
+import io
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.html', '.js', '.json', '.map', '.svg', '.txt', '.xml',
+    '.yaml', '.yml',
+)
+MIN_COMPRESS_SIZE: int = 256
+# Варианты в порядке предпочтения: кодировка Accept-Encoding и суффикс.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def gzip_compress(content):
+    """gzip с нулевым mtime: повторная сборка дает те же байты."""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9,
+                       mtime=0) as archive:
+        archive.write(content)
+    return buffer.getvalue()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Сохраняет статику с хешем содержимого в имени
+    и кладет рядом сжатые копии .gz и .br (если установлен brotli),
+    чтобы отдавать их без сжатия на лету.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_files = {}
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_files[name] = hashed_name
+        if dry_run:
+            return
+        for name, hashed_name in hashed_files.items():
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        """Сжатые копии пересоздаются, только если исходный файл новее,
+        поэтому повторный collectstatic при старте контейнера быстрый.
+        """
+        path = self.path(name)
+        suffixes = ('.gz', '.br') if brotli is not None else ('.gz',)
+        modified = os.path.getmtime(path)
+        if all(os.path.isfile(path + suffix)
+               and os.path.getmtime(path + suffix) >= modified
+               for suffix in suffixes):
+            return
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip_compress(content)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(content):
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+
+
+def accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encodings = set()
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def serve(request, path):
+    """Отдает файл из STATIC_ROOT, выбирая заранее сжатый вариант
+    по Accept-Encoding. Файлы с хешем в имени не меняются,
+    поэтому кешируются навсегда, остальные проверяются по Last-Modified.
+    """
+    fullpath = safe_join(settings.STATIC_ROOT, path)
+    if not os.path.isfile(fullpath):
+        raise Http404
+    content_type, _ = mimetypes.guess_type(fullpath)
+    accepted = accepted_encodings(request)
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(fullpath + suffix):
+            encoding = name
+            break
+    filename = fullpath + suffix if encoding else fullpath
+    stat = os.stat(filename)
+    cache_control = IMMUTABLE if HASHED_NAME.search(path) else 'no-cache'
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(filename, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+            filename=os.path.basename(fullpath),
+        )
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = cache_control
+    return response
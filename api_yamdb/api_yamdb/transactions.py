@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db import connections, models, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+# Номер транзакции PostgreSQL и самая старая транзакция,
+# которая еще не завершилась.
+TXID_CURRENT = 'txid_current()'
+SNAPSHOT_XMIN = 'txid_snapshot_xmin(txid_current_snapshot())'
+
+
+def transaction_id(using):
+    """Номер текущей транзакции для записи журнала. В других СУБД 0:
+    SQLite выполняет пишущие транзакции по одной, и порядок
+    номеров записей совпадает с порядком фиксации.
+    """
+    if connections[using].vendor == 'postgresql':
+        return RawSQL(TXID_CURRENT, ())
+    return 0
+
+
+class TransactionOrderedQuerySet(models.QuerySet):
+    """Выборка из таблицы, которую читают по курсору (txid, pk).
+    В модели нужно поле txid, заполняемое transaction_id при вставке,
+    и поле времени записи settled_field для СУБД кроме PostgreSQL.
+    """
+    settled_field = None
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.txid = transaction_id(self.db)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def settled(self):
+        """Записи, перед которыми в порядке (txid, pk) новые
+        уже не появятся. В PostgreSQL это записи транзакций старше
+        самой старой незавершенной: все последующие записи получат
+        номер транзакции не меньше ее. В других СУБД - записи
+        старше CHANGE_FEED_LAG.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            return self.filter(txid__lt=RawSQL(SNAPSHOT_XMIN, ()))
+        return self.filter(**{
+            f'{self.settled_field}__lte':
+                timezone.now() - settings.CHANGE_FEED_LAG
+        })
+
+    def after(self, cursor):
+        """Записи строго после курсора (txid, pk) по порядку журнала."""
+        txid, pk = cursor
+        return self.filter(
+            Q(txid__gt=txid) | Q(txid=txid, pk__gt=pk)
+        ).order_by('txid', 'pk')
+
+    def cursor(self):
+        """Курсор после последней записи, перед которой новые
+        уже не появятся, или (0, 0).
+        """
+        return self.settled().order_by('txid', 'pk').values_list(
+            'txid', 'pk').last() or (0, 0)
+
+
+def set_transaction_id(instance, kwargs):
+    """Заполняет txid новой записи в Model.save."""
+    if instance._state.adding:
+        instance.txid = transaction_id(
+            kwargs.get('using') or router.db_for_write(type(instance)))
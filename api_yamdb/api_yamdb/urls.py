@@ -1,15 +1,25 @@
+from django.conf import settings
 from django.contrib import admin
 
-from django.urls import include, path
+from django.urls import include, path, re_path
 
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
 from django.views.generic import TemplateView
 
+from .staticfiles import serve
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path(
         'redoc/',
-        TemplateView.as_view(template_name='redoc.html'),
+        gzip_page(cache_control(public=True, max_age=3600)(
+            TemplateView.as_view(template_name='redoc.html'))),
         name='redoc'
     ),
 ]
+
+if settings.SERVE_STATIC:
+    urlpatterns.append(re_path(
+        r'^{}(?P<path>.+)$'.format(settings.STATIC_URL.lstrip('/')), serve))
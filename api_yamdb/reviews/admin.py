@@ -1,8 +1,17 @@
 from django.contrib import admin
 
+from .admin_utils import AutocompleteFilter, LargeTableAdmin
 from .models import Category, Title, Genre, GenreTitle, Review, Comment
 
 
+class TitleFilter(AutocompleteFilter):
+    field_name = 'title'
+
+
+class AuthorFilter(AutocompleteFilter):
+    field_name = 'author'
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'slug')
@@ -16,34 +25,58 @@ class GenreAdmin(admin.ModelAdmin):
 
 
 @admin.register(Title)
-class TitleAdmin(admin.ModelAdmin):
+class TitleAdmin(LargeTableAdmin):
     list_display = (
         'pk', 'name', 'year', 'description',
         'category', 'display_genre'
     )
     list_editable = ('category',)
     list_filter = ('category', 'year')
-    search_fields = ('description',)
+    list_select_related = ('category',)
+    search_fields = ('name', 'description',)
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genre')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """Список категорий для list_editable запрашивается
+        один раз на страницу, а не для каждой строки.
+        """
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'category':
+            choices = getattr(request, '_category_choices', None)
+            if choices is None:
+                choices = list(formfield.choices)
+                request._category_choices = choices
+            formfield.choices = choices
+        return formfield
+
 
 @admin.register(GenreTitle)
-class GenreTitleAdmin(admin.ModelAdmin):
+class GenreTitleAdmin(LargeTableAdmin):
     list_display = ('pk', 'title', 'genre')
     list_filter = ('genre',)
+    list_select_related = ('title', 'genre')
+    autocomplete_fields = ('title',)
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ('pk', 'title', 'text', 'score', 'author', 'pub_date')
     search_fields = ('author__username', 'text',)
-    list_filter = ('title', 'score',)
+    list_filter = (TitleFilter, 'score', 'is_hidden')
+    list_select_related = ('title', 'author')
+    autocomplete_fields = ('title', 'author')
     empty_value_display = '-пусто-'
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('pk', 'review', 'text', 'author', 'pub_date')
     search_fields = ('text',)
-    list_filter = ('pub_date', 'author',)
+    list_filter = ('pub_date', AuthorFilter, 'is_hidden')
+    list_select_related = ('review__author', 'author')
+    autocomplete_fields = ('review', 'author')
     empty_value_display = '-пусто-'
@@ -0,0 +1,85 @@
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ADMIN_COUNT_ESTIMATE_FROM: int = settings.ADMIN_COUNT_ESTIMATE_FROM
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц.
+    Для выборки без фильтров в PostgreSQL число строк берется
+    из статистики планировщика вместо точного COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE relname = %s',
+                        (queryset.model._meta.db_table,)
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= ADMIN_COUNT_ESTIMATE_FROM:
+                    return int(row[0])
+        return super().count
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по внешнему ключу с поиском значения через автодополнение.
+    В боковую панель не выгружаются все связанные объекты,
+    запрашивается только выбранный.
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        field = model._meta.get_field(self.field_name)
+        self.title = field.verbose_name
+        self.parameter_name = f'{self.field_name}__id__exact'
+        super().__init__(request, params, model, model_admin)
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+    @property
+    def widget_id(self):
+        return f'id_filter_{self.field_name}'
+
+    def rendered_widget(self):
+        return self.form_field.widget.render(
+            self.parameter_name, self.value(), attrs={'id': self.widget_id}
+        )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Базовая админка для больших таблиц: оценка числа строк
+    и статика для фильтров с автодополнением.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
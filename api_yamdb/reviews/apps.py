@@ -1,6 +1,40 @@
 from django.apps import AppConfig
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete, pre_save)
 
 
 class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reviews'
+
+    def ready(self):
+        from . import stats
+        from .models import (Category, Comment, Genre, GenreTitle, Review,
+                             Title, User)
+        from .signals import (create_search_indexes, log_delete, log_save,
+                              log_user_saved, log_user_saving)
+
+        post_migrate.connect(create_search_indexes, sender=self)
+        for model in (Title, Review, Comment, Category, Genre):
+            post_save.connect(log_save, sender=model)
+            post_delete.connect(log_delete, sender=model)
+        pre_save.connect(log_user_saving, sender=User)
+        post_save.connect(log_user_saved, sender=User)
+
+        pre_save.connect(stats.review_saving, sender=Review)
+        post_save.connect(stats.review_saved, sender=Review)
+        post_delete.connect(stats.review_deleted, sender=Review)
+        pre_save.connect(stats.title_saving, sender=Title)
+        post_save.connect(stats.title_saved, sender=Title)
+        pre_delete.connect(stats.title_deleting, sender=Title)
+        post_delete.connect(stats.title_deleted, sender=Title)
+        post_save.connect(stats.genre_title_saved, sender=GenreTitle)
+        post_delete.connect(stats.genre_title_deleted, sender=GenreTitle)
+        m2m_changed.connect(stats.genres_changed, sender=GenreTitle)
+        pre_save.connect(stats.user_saving, sender=User)
+        post_save.connect(stats.user_saved, sender=User)
+        pre_delete.connect(stats.user_deleting, sender=User)
+        post_delete.connect(stats.user_deleted, sender=User)
+        for model in (Category, Genre):
+            post_save.connect(stats.label_saved, sender=model)
+            post_delete.connect(stats.label_deleted, sender=model)
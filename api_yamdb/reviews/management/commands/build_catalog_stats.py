@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews import stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчет статистики каталога по категориям, жанрам и годам '
+            'выпуска из произведений и отзывов. Между запусками сводка '
+            'обновляется при записи отзывов, периодический пересчет '
+            'исправляет расхождения после загрузки данных и ручных правок.')
+
+    def handle(self, *args, **options):
+        timer = time.perf_counter()
+        count = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано строк статистики: {count}, '
+            f'{time.perf_counter() - timer:.1f} с.'
+        ))
@@ -0,0 +1,190 @@
+import argparse
+import time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from reviews.models import Change, Review, SimilarTitle
+
+READ_CHUNK_SIZE: int = 100000
+
+
+def load_scores(queryset, chunk_size=READ_CHUNK_SIZE):
+    """Читает тройки (author_id, title_id, score) в массив пачками,
+    не создавая список кортежей на всю таблицу.
+    """
+    rows = queryset.values_list('author_id', 'title_id', 'score').iterator(
+        chunk_size=chunk_size)
+    blocks = []
+    while True:
+        block = list(islice(rows, chunk_size))
+        if not block:
+            break
+        blocks.append(np.array(block, dtype=np.int64))
+    if not blocks:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.concatenate(blocks)
+
+
+def build_matrix(scores, adjusted):
+    """Разреженная матрица произведение x пользователь
+    с нормированными строками и id произведений по строкам.
+    Для adjusted-cosine из оценки вычитается средняя оценка пользователя.
+    """
+    title_ids, rows = np.unique(scores[:, 1], return_inverse=True)
+    _, columns = np.unique(scores[:, 0], return_inverse=True)
+    values = scores[:, 2].astype(np.float32)
+    if adjusted:
+        means = np.bincount(columns, weights=values) / np.bincount(columns)
+        values -= means[columns].astype(np.float32)
+    matrix = sparse.csr_matrix(
+        (values, (rows, columns)),
+        shape=(len(title_ids), columns.max() + 1)
+    )
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inverse = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    return sparse.diags(inverse) @ matrix, title_ids
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('Ожидается целое число не меньше 1.')
+    return number
+
+
+def top_neighbors(similarity, top_k):
+    """Столбцы и значения top_k наибольших элементов каждой строки
+    плотного блока по убыванию значения.
+    """
+    top_k = min(top_k, similarity.shape[1])
+    columns = np.argpartition(-similarity, top_k - 1, axis=1)[:, :top_k]
+    values = np.take_along_axis(similarity, columns, axis=1)
+    order = np.argsort(-values, axis=1)
+    return (np.take_along_axis(columns, order, axis=1),
+            np.take_along_axis(values, order, axis=1))
+
+
+class Command(BaseCommand):
+    help = ('Расчет похожих произведений по оценкам в отзывах: '
+            'косинусная близость строк разреженной матрицы '
+            'произведение x пользователь, которая умножается блоками строк. '
+            'С --incremental перемножаются только строки произведений, '
+            'отзывы которых изменились после курсора журнала изменений '
+            'прошлого запуска, и тех, '
+            'в списки которых они входят (matrix[affected] @ matrix.T). '
+            'Оценки при этом читаются все: от них зависят нормы строк '
+            'и средние оценки пользователей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=positive_int,
+            default=settings.SIMILAR_TITLES_TOP_K,
+            help='Сколько соседей хранить для каждого произведения.'
+        )
+        parser.add_argument(
+            '--method',
+            choices=('cosine', 'adjusted'),
+            default='adjusted',
+            help=('cosine - по исходным оценкам, adjusted - по отклонению '
+                  'от средней оценки пользователя.')
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=positive_int,
+            default=256,
+            help=('Количество строк матрицы в одном блоке умножения: '
+                  'блок занимает chunk-size x число произведений x 4 байта.')
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Пересчитать только затронутые изменениями отзывов списки.'
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        timer = time.perf_counter()
+        # Курсор берется до чтения оценок: изменения после него
+        # следующий инкрементальный запуск прочитает снова.
+        cursor = Change.objects.cursor()
+        scores = load_scores(Review.objects.filter(
+            title__is_deleted=False, author__is_deleted=False,
+            is_hidden=False))
+        affected = self.affected_titles() if options['incremental'] else None
+        if not len(scores):
+            SimilarTitle.objects.all().delete()
+            self.stdout.write('Отзывов нет, списки очищены.')
+            return
+        matrix, title_ids = build_matrix(
+            scores, options['method'] == 'adjusted')
+        loaded = time.perf_counter() - timer
+        if affected is None:
+            rows = np.arange(len(title_ids))
+        else:
+            rows = np.flatnonzero(np.isin(title_ids, list(affected)))
+            SimilarTitle.objects.filter(
+                title_id__in=affected - set(title_ids.tolist())).delete()
+        transposed = matrix.T.tocsr()
+        for start in range(0, len(rows), options['chunk_size']):
+            chunk = rows[start:start + options['chunk_size']]
+            similarity = (matrix[chunk] @ transposed).toarray()
+            similarity[np.arange(len(chunk)), chunk] = -np.inf
+            neighbors, values = top_neighbors(similarity, options['top_k'])
+            self.save(
+                title_ids, chunk, neighbors, values, started, cursor)
+        if affected is None:
+            SimilarTitle.objects.filter(computed_at__lt=started).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано списков: {len(rows)} из {len(title_ids)}, '
+            f'оценок: {len(scores)}, чтение {loaded:.1f} с, '
+            f'расчет {time.perf_counter() - timer - loaded:.1f} с.'
+        ))
+
+    def affected_titles(self):
+        """Произведения, отзывы которых изменились после курсора
+        журнала прошлого запуска, и произведения, в списках которых
+        они есть. None, если списков еще нет и нужен полный расчет.
+        """
+        cursor = SimilarTitle.objects.order_by(
+            'change_txid', 'change_id'
+        ).values_list('change_txid', 'change_id').last()
+        if cursor is None:
+            return None
+        changed = set(Change.objects.after(cursor).filter(
+            model='review').values_list('parent_id', flat=True))
+        return changed | set(SimilarTitle.objects.filter(
+            similar_id__in=changed).values_list('title_id', flat=True))
+
+    def save(self, title_ids, rows, neighbors, values, computed_at, cursor):
+        """Заменяет списки блока строк в одной транзакции.
+        Сохраняются только соседи с положительным сходством.
+        """
+        positive = values > 0
+        counts = positive.sum(axis=1)
+        objects = [
+            SimilarTitle(
+                title_id=title_id,
+                similar_id=similar_id,
+                score=score,
+                computed_at=computed_at,
+                change_txid=cursor[0],
+                change_id=cursor[1]
+            )
+            for title_id, similar_id, score in zip(
+                np.repeat(title_ids[rows], counts).tolist(),
+                title_ids[neighbors[positive]].tolist(),
+                values[positive].tolist(),
+            )
+        ]
+        with transaction.atomic():
+            SimilarTitle.objects.filter(
+                title_id__in=title_ids[rows].tolist()).delete()
+            SimilarTitle.objects.bulk_create(objects)
@@ -0,0 +1,206 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+
+from reviews import stats
+
+CHUNK_SIZE: int = 1 << 16
+
+
+class JSONArrayReader:
+    """Возвращает элементы JSON-массива по одному,
+    читая файл блоками, а не целиком.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+
+    def read_more(self, message):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            raise CommandError(message)
+        self.buffer += chunk
+
+    def next_char(self):
+        self.buffer = self.buffer.lstrip()
+        while not self.buffer:
+            self.read_more('Файл оборвался внутри JSON-массива.')
+            self.buffer = self.buffer.lstrip()
+        return self.buffer[0]
+
+    def expect(self, char, message):
+        if self.next_char() != char:
+            raise CommandError(message)
+        self.buffer = self.buffer[1:]
+
+    def decode(self):
+        self.next_char()
+        while True:
+            try:
+                record, end = self.decoder.raw_decode(self.buffer)
+            except json.JSONDecodeError as error:
+                self.read_more(f'Ошибка разбора JSON: {error}')
+                continue
+            self.buffer = self.buffer[end:]
+            return record
+
+    def __iter__(self):
+        self.expect('[', 'Фикстура должна быть JSON-массивом.')
+        if self.next_char() == ']':
+            return
+        while True:
+            yield self.decode()
+            if self.next_char() == ']':
+                return
+            self.expect(',', 'Ожидалась запятая между записями.')
+
+
+@contextmanager
+def raw_dates(model):
+    """Отключает auto_now и auto_now_add, чтобы bulk_create
+    сохранил даты из фикстуры, а не текущее время.
+    """
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False)
+              or getattr(field, 'auto_now_add', False)]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Быстрая загрузка фикстуры в формате dumpdata: потоковое чтение, '
+            'bulk_create по моделям в порядке зависимостей, '
+            'массовое восстановление связей many-to-many '
+            'и сброс последовательностей первичных ключей. '
+            'Сигналы save() не вызываются, поэтому по завершении '
+            'статистика каталога пересчитывается, а кеш очищается целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', help='Путь к JSON-фикстуре.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей одной модели в одном INSERT.'
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help=('Пропускать уже существующие строки, например типы '
+                  'контента, созданные командой migrate.')
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.ignore_conflicts = options['ignore_conflicts']
+        self.buffers = defaultdict(list)
+        self.dependencies = {}
+        self.loaded = defaultdict(int)
+        self.total = 0
+        self.started = time.perf_counter()
+        with open(options['fixture'], encoding='utf-8') as stream:
+            with transaction.atomic():
+                for record in JSONArrayReader(stream):
+                    model = self.get_model(record['model'])
+                    self.buffers[model].append(record)
+                    if len(self.buffers[model]) >= self.batch_size:
+                        self.flush(model)
+                while self.buffers:
+                    self.flush(next(iter(self.buffers)))
+                self.reset_sequences()
+                stats.rebuild()
+                transaction.on_commit(cache.clear)
+        elapsed = time.perf_counter() - self.started
+        for model, count in self.loaded.items():
+            self.stdout.write(f'{model._meta.label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {self.total} записей за {elapsed:.1f} с '
+            f'({self.total / max(elapsed, 1e-9):.0f} записей/с).'
+        ))
+
+    def get_model(self, label):
+        try:
+            model = apps.get_model(label)
+        except (LookupError, ValueError):
+            raise CommandError(f'Неизвестная модель {label}.')
+        if model not in self.dependencies:
+            self.dependencies[model] = {
+                field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is not model
+            }
+        return model
+
+    def flush(self, model):
+        """Записывает накопленные строки модели одним bulk_create.
+        Перед этим записываются накопленные строки моделей,
+        на которые она ссылается. Проверка внешних ключей отложена
+        до конца транзакции, поэтому ссылки вперед по файлу допустимы.
+        """
+        records = self.buffers.pop(model, None)
+        if not records:
+            return
+        for dependency in self.dependencies[model]:
+            self.flush(dependency)
+        objects = list(Deserializer(records, ignorenonexistent=True))
+        with raw_dates(model):
+            model._base_manager.bulk_create(
+                [item.object for item in objects],
+                batch_size=self.batch_size,
+                ignore_conflicts=self.ignore_conflicts,
+            )
+        self.save_m2m(model, objects)
+        self.loaded[model] += len(objects)
+        self.total += len(objects)
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'{self.total} записей, {self.total / max(elapsed, 1e-9):.0f} '
+            f'записей/с ({model._meta.label} +{len(objects)})'
+        )
+
+    def save_m2m(self, model, objects):
+        rows = defaultdict(list)
+        for item in objects:
+            for field_name, values in (item.m2m_data or {}).items():
+                field = model._meta.get_field(field_name)
+                through = field.remote_field.through
+                source = f'{field.m2m_field_name()}_id'
+                target = f'{field.m2m_reverse_field_name()}_id'
+                rows[through].extend(
+                    through(**{source: item.object.pk, target: value})
+                    for value in values
+                )
+        for through, through_rows in rows.items():
+            through._base_manager.bulk_create(
+                through_rows,
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+
+    def reset_sequences(self):
+        models = list(self.loaded)
+        for model in self.loaded:
+            models.extend(
+                field.remote_field.through
+                for field in model._meta.local_many_to_many
+            )
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,239 @@
+from datetime import date, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone as django_timezone
+
+from reviews.models import Comment, Review
+
+# Ключ секционирования таблиц для каждой стратегии.
+# Хеш по произведению и отзыву совпадает с фильтрами ReviewViewSet
+# и CommentViewSet, поэтому их запросы читают одну секцию.
+PARTITION_KEYS = {
+    'hash': ((Review, 'title'), (Comment, 'review')),
+    'range': ((Review, 'pub_date'), (Comment, 'pub_date')),
+}
+STRATEGY_CODES = {'hash': 'h', 'range': 'r'}
+
+INDEXES_SQL = (
+    'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+    'WHERE indrelid = %s::regclass AND NOT indisunique'
+)
+CONSTRAINTS_SQL = (
+    'SELECT conname, contype, pg_get_constraintdef(oid), '
+    'ARRAY(SELECT attname FROM pg_attribute '
+    'WHERE attrelid = conrelid AND attnum = ANY(conkey)) '
+    'FROM pg_constraint '
+    "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')"
+)
+REFERENCES_SQL = (
+    'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+    "WHERE confrelid = %s::regclass AND contype = 'f' "
+    'AND conrelid <> confrelid'
+)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_of(value):
+    return value.astimezone(timezone.utc).date().replace(day=1)
+
+
+class Command(BaseCommand):
+    help = ('Декларативное секционирование таблиц отзывов и комментариев '
+            'в PostgreSQL: перевод существующих таблиц на секции '
+            'по хешу произведения и отзыва или по месяцам pub_date '
+            'и создание секций на будущие месяцы. '
+            'Повторный запуск только добавляет недостающие секции. '
+            'ВНИМАНИЕ: первичный ключ секционированной таблицы включает '
+            'ключ секционирования, поэтому внешние ключи других таблиц '
+            'на нее (comments.review_id) удаляются, а целостность '
+            'обеспечивает только каскадное удаление Django. Команда '
+            'не выполняется без --drop-foreign-keys, а уникальные '
+            'ограничения без ключа секционирования (unique_review '
+            'при --strategy range) удаляет только с --drop-unique.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strategy',
+            choices=tuple(PARTITION_KEYS),
+            default='hash',
+            help=('hash - по произведению для отзывов и по отзыву '
+                  'для комментариев, range - по месяцам pub_date.')
+        )
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=16,
+            help='Количество хеш-секций, задается при переводе таблиц.'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='На сколько месяцев вперед создавать секции по pub_date.'
+        )
+        parser.add_argument(
+            '--drop-foreign-keys',
+            action='store_true',
+            help=('Согласие удалить внешние ключи других таблиц '
+                  'на секционируемые (comments.review_id на отзывы).')
+        )
+        parser.add_argument(
+            '--drop-unique',
+            action='store_true',
+            help=('Согласие удалить уникальные ограничения, которые '
+                  'не включают ключ секционирования. Для отзывов при '
+                  '--strategy range это unique_review: один отзыв автора '
+                  'на произведение останется только проверкой сериализатора.')
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Секционирование поддерживается только в PostgreSQL.')
+        self.strategy = options['strategy']
+        self.partitions = options['partitions']
+        self.months_ahead = options['months_ahead']
+        self.drop_foreign_keys = options['drop_foreign_keys']
+        self.drop_unique = options['drop_unique']
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Отложенные проверки внешних ключей внешней транзакции
+                # не дали бы удалить старую таблицу.
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                for model, field_name in PARTITION_KEYS[self.strategy]:
+                    self.partition(cursor, model, field_name)
+        except DatabaseError as error:
+            raise CommandError(error)
+
+    def partition(self, cursor, model, field_name):
+        table = model._meta.db_table
+        cursor.execute(
+            'SELECT partstrat FROM pg_partitioned_table '
+            'WHERE partrelid = %s::regclass',
+            [table]
+        )
+        row = cursor.fetchone()
+        if row is None:
+            self.convert(cursor, model, model._meta.get_field(field_name))
+        elif row[0] != STRATEGY_CODES[self.strategy]:
+            raise CommandError(
+                f'Таблица {table} уже секционирована по другой стратегии.')
+        elif self.strategy == 'range':
+            self.create_partitions(
+                cursor, table, month_of(django_timezone.now()))
+        cursor.execute(
+            'SELECT COUNT(*) FROM pg_inherits WHERE inhparent = %s::regclass',
+            [table]
+        )
+        self.stdout.write(f'{table}: секций {cursor.fetchone()[0]}.')
+
+    def create_partitions(self, cursor, table, first_month):
+        if self.strategy == 'hash':
+            for remainder in range(self.partitions):
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table}_p{remainder} '
+                    f'PARTITION OF {table} FOR VALUES WITH '
+                    f'(MODULUS {self.partitions}, REMAINDER {remainder})'
+                )
+            return
+        last_month = add_months(
+            month_of(django_timezone.now()), self.months_ahead)
+        month = first_month
+        while month <= last_month:
+            next_month = add_months(month, 1)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {table}_p{month:%Y%m} '
+                f'PARTITION OF {table} FOR VALUES '
+                f"FROM ('{month} 00:00+00') TO ('{next_month} 00:00+00')"
+            )
+            month = next_month
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {table}_default '
+            f'PARTITION OF {table} DEFAULT'
+        )
+
+    def check_losses(self, table, key, constraints, references):
+        """Отказывается ослаблять схему без явного согласия:
+        уникальные ограничения без ключа секционирования и внешние
+        ключи других таблиц на эту таблицу перенести нельзя.
+        """
+        lost_unique = [
+            name for name, kind, _, columns in constraints
+            if kind == 'u' and key.column not in columns
+        ]
+        if lost_unique and not self.drop_unique:
+            raise CommandError(
+                f'{table}: ограничения {", ".join(lost_unique)} не включают '
+                f'{key.column} и не могут быть перенесены. Выберите другую '
+                'стратегию или подтвердите удаление флагом --drop-unique.'
+            )
+        if references and not self.drop_foreign_keys:
+            names = ', '.join(
+                f'{referencing}.{name}' for referencing, name in references)
+            raise CommandError(
+                f'{table}: внешние ключи {names} будут удалены. '
+                'Подтвердите удаление флагом --drop-foreign-keys.'
+            )
+
+    def convert(self, cursor, model, key):
+        """Переводит обычную таблицу на секции в одной транзакции.
+        Первичный ключ и уникальные ограничения должны включать ключ
+        секционирования: первичный ключ расширяется им, а уникальные
+        ограничения без него и внешние ключи из других таблиц
+        на эту таблицу переносятся только с согласия (check_losses).
+        """
+        table = model._meta.db_table
+        pk = model._meta.pk.column
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(INDEXES_SQL, [table])
+        indexes = [definition for definition, in cursor.fetchall()]
+        cursor.execute(CONSTRAINTS_SQL, [table])
+        constraints = cursor.fetchall()
+        cursor.execute(REFERENCES_SQL, [table])
+        references = cursor.fetchall()
+        self.check_losses(table, key, constraints, references)
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, pk])
+        sequence = cursor.fetchone()[0]
+        first_month = month_of(django_timezone.now())
+        if self.strategy == 'range':
+            cursor.execute(f'SELECT MIN({key.column}) FROM {table}')
+            oldest = cursor.fetchone()[0]
+            if oldest is not None:
+                first_month = month_of(oldest)
+
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+        cursor.execute(
+            f'CREATE TABLE {table} '
+            f'(LIKE {table}_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY {self.strategy.upper()} ({key.column})'
+        )
+        self.create_partitions(cursor, table, first_month)
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {table}_old')
+        cursor.execute(f'DROP TABLE {table}_old CASCADE')
+
+        for name, kind, definition, columns in constraints:
+            if kind == 'p':
+                definition = f'PRIMARY KEY ({pk}, {key.column})'
+            elif kind == 'u' and key.column not in columns:
+                self.stdout.write(self.style.WARNING(
+                    f'{table}: ограничение {name} не включает '
+                    f'{key.column} и удалено (--drop-unique).'
+                ))
+                continue
+            cursor.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.{pk}')
+        for referencing, name in references:
+            self.stdout.write(self.style.WARNING(
+                f'{referencing}: внешний ключ {name} на {table} удален '
+                '(--drop-foreign-keys), связь поддерживается только '
+                'каскадным удалением Django.'
+            ))
@@ -0,0 +1,102 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from reviews import stats
+from reviews.models import Comment, GenreTitle, Review, Title, User
+
+
+def delete_in_batches(queryset, batch_size):
+    """Удаляет записи выборки пачками не больше batch_size.
+    Каждая пачка удаляется в отдельной короткой транзакции.
+    """
+    deleted = 0
+    model = queryset.model
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            model.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+
+
+class Command(BaseCommand):
+    help = ('Фоновое удаление помеченных произведений и пользователей '
+            'вместе с отзывами и комментариями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.DELETE_BATCH_SIZE,
+            help='Количество записей, удаляемых за одну транзакцию.'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Пауза между проверками очереди в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            purged = self.purge(batch_size)
+            if not options['loop']:
+                return
+            if not purged:
+                time.sleep(options['interval'])
+
+    def purge(self, batch_size):
+        purged = 0
+        for title in Title.objects.filter(is_deleted=True).iterator():
+            self.purge_title(title, batch_size)
+            purged += 1
+        for user in User.objects.filter(is_deleted=True).iterator():
+            self.purge_user(user, batch_size)
+            purged += 1
+        return purged
+
+    def purge_title(self, title, batch_size):
+        """Комментарии и отзывы удаляются до самого произведения,
+        поэтому каскад при удалении строки произведения пуст.
+        Помеченное произведение уже не входит в статистику каталога,
+        и обработчики удаления его строк ее не пересчитывают.
+        """
+        title_id = title.pk
+        with stats.purging('titles', title_id):
+            comments = delete_in_batches(
+                Comment.objects.filter(review__title=title), batch_size)
+            reviews = delete_in_batches(
+                Review.objects.filter(title=title), batch_size)
+            delete_in_batches(
+                GenreTitle.objects.filter(title=title), batch_size)
+            title.delete()
+        self.stdout.write(
+            f'Произведение {title_id}: удалено отзывов {reviews}, '
+            f'комментариев {comments}.'
+        )
+
+    def purge_user(self, user, batch_size):
+        with stats.purging('users', user.pk):
+            comments = delete_in_batches(
+                Comment.objects.filter(
+                    Q(author=user) | Q(review__author=user)),
+                batch_size
+            )
+            reviews = delete_in_batches(
+                Review.objects.filter(author=user), batch_size)
+            user.delete()
+        self.stdout.write(
+            f'Пользователь {user.username}: удалено отзывов {reviews}, '
+            f'комментариев {comments}.'
+        )
@@ -4,6 +4,9 @@ from django.db import models
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
 
+from api_yamdb.transactions import (TransactionOrderedQuerySet,
+                                    set_transaction_id)
+
 User = get_user_model()
 
 CLS_NAME_LEN: int = settings.CLS_NAME_LEN
@@ -84,11 +87,19 @@ class Title(models.Model):
         related_name='titles',
         verbose_name='Категория'
     )
+    is_deleted = models.BooleanField(
+        'Помечено к удалению',
+        default=False,
+        db_index=True,
+    )
 
     class Meta:
         ordering = ('pk',)
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
+        indexes = (
+            models.Index(fields=('year',), name='title_year_idx'),
+        )
 
     def __str__(self) -> str:
         return self.name[:CLS_NAME_LEN]
@@ -96,10 +107,15 @@ class Title(models.Model):
     def display_genre(self):
         """Создает строковое представление жанров для админки."""
         return ', '.join(
-            [genre.name for genre in self.genre.all()[:GENRES_NUM_SHOW]])
+            [genre.name for genre in self.genre.all()][:GENRES_NUM_SHOW])
 
     display_genre.short_description = 'Жанр'
 
+    def mark_deleted(self):
+        """Скрывает произведение до фонового удаления отзывов."""
+        self.is_deleted = True
+        self.save(update_fields=('is_deleted',))
+
 
 class GenreTitle(models.Model):
     """Модель для поля many-to-many."""
@@ -159,6 +175,10 @@ class Review(models.Model):
         'Дата публикации отзыва',
         auto_now_add=True,
         db_index=True)
+    is_hidden = models.BooleanField(
+        'Скрыт модератором',
+        default=False,
+    )
 
     class Meta:
         ordering = ('pub_date',)
@@ -170,6 +190,10 @@ class Review(models.Model):
                 name='unique_review'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'pub_date'), name='review_author_date_idx'),
+        )
 
     def __str__(self) -> str:
         return (f'Пользователь {self.author} '
@@ -198,11 +222,214 @@ class Comment(models.Model):
         'Дата публикации комментария',
         auto_now_add=True,
         db_index=True)
+    is_hidden = models.BooleanField(
+        'Скрыт модератором',
+        default=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('author', 'pub_date'), name='comment_author_date_idx'),
+        )
 
     def __str__(self) -> str:
         return self.text[:CLS_NAME_LEN]
+
+
+class ChangeQuerySet(TransactionOrderedQuerySet):
+    settled_field = 'changed_at'
+
+
+class Change(models.Model):
+    """Запись журнала изменений каталога, отзывов и комментариев.
+    Записи только добавляются. Курсор синхронизации - пара
+    (txid, pk): порядок номеров транзакций, в отличие от порядка
+    id, не нарушают транзакции, которые фиксируются долго.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    ACTIONS = [
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+
+    model = models.CharField(
+        'Модель',
+        max_length=16
+    )
+    object_id = models.PositiveBigIntegerField(
+        'Идентификатор объекта'
+    )
+    parent_id = models.PositiveBigIntegerField(
+        'Идентификатор родителя',
+        null=True,
+        blank=True,
+        help_text='Произведение отзыва или отзыв комментария'
+    )
+    action = models.CharField(
+        'Действие',
+        max_length=6,
+        choices=ACTIONS
+    )
+    changed_at = models.DateTimeField(
+        'Время изменения',
+        auto_now_add=True
+    )
+    txid = models.PositiveBigIntegerField(
+        'Транзакция',
+        default=0,
+        editable=False,
+        help_text='Номер транзакции PostgreSQL, в которой сделана запись'
+    )
+
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('txid', 'pk')
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = (
+            models.Index(fields=('txid', 'id'), name='change_txid_id_idx'),
+            models.Index(
+                fields=('model', 'txid', 'id'), name='change_model_txid_idx'),
+        )
+
+    def save(self, *args, **kwargs):
+        set_transaction_id(self, kwargs)
+        super().save(*args, **kwargs)
+
+    def __str__(self) -> str:
+        return f'{self.action} {self.model} {self.object_id}'
+
+
+class SimilarTitle(models.Model):
+    """Сосед произведения по оценкам пользователей.
+    Списки строятся командой build_similar_titles.
+    """
+    title = models.ForeignKey(
+        Title,
+        verbose_name='Произведение',
+        on_delete=models.CASCADE,
+        related_name='similar_titles'
+    )
+    similar = models.ForeignKey(
+        Title,
+        verbose_name='Похожее произведение',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField(
+        'Сходство'
+    )
+    computed_at = models.DateTimeField(
+        'Время расчета',
+        help_text='Начало запуска команды, рассчитавшей список'
+    )
+    change_txid = models.PositiveBigIntegerField(
+        'Транзакция курсора',
+        default=0,
+        help_text=('Курсор журнала изменений (txid, id) на начало запуска: '
+                   'следующий инкрементальный расчет читает изменения после '
+                   'него')
+    )
+    change_id = models.PositiveBigIntegerField(
+        'Запись курсора',
+        default=0
+    )
+
+    class Meta:
+        ordering = ('title', '-score')
+        verbose_name = 'Похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('title', 'similar'),
+                name='unique_similar_title'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('title', '-score'), name='similar_title_score_idx'),
+            models.Index(
+                fields=('change_txid', 'change_id'),
+                name='similar_change_cursor_idx'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.title_id} -> {self.similar_id}: {self.score:.3f}'
+
+
+class CatalogStat(models.Model):
+    """Сводка по категории, жанру или году выпуска: число произведений,
+    видимых отзывов и сумма их оценок. Строки обновляются при записи
+    отзывов и произведений, команда build_catalog_stats пересчитывает их.
+    """
+    CATEGORY = 'category'
+    GENRE = 'genre'
+    YEAR = 'year'
+
+    DIMENSIONS = [
+        (CATEGORY, 'Category'),
+        (GENRE, 'Genre'),
+        (YEAR, 'Year'),
+    ]
+
+    dimension = models.CharField(
+        'Разрез',
+        max_length=8,
+        choices=DIMENSIONS
+    )
+    key = models.PositiveIntegerField(
+        'Ключ',
+        help_text='Идентификатор категории или жанра либо год выпуска'
+    )
+    slug = models.SlugField(
+        'slug-адрес',
+        blank=True
+    )
+    name = models.CharField(
+        'Название',
+        max_length=256
+    )
+    titles = models.PositiveIntegerField(
+        'Произведений',
+        default=0
+    )
+    reviews = models.PositiveBigIntegerField(
+        'Отзывов',
+        default=0
+    )
+    score_sum = models.PositiveBigIntegerField(
+        'Сумма оценок',
+        default=0
+    )
+    updated_at = models.DateTimeField(
+        'Время обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        ordering = ('dimension', 'slug', 'key')
+        verbose_name = 'Статистика каталога'
+        verbose_name_plural = 'Статистика каталога'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('dimension', 'key'),
+                name='unique_catalog_stat'
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.dimension} {self.name}'
+
+    @property
+    def rating(self):
+        """Средняя оценка всех видимых отзывов разреза."""
+        return self.score_sum / self.reviews if self.reviews else None
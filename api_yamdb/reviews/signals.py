@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.dispatch import Signal
+
+from api_yamdb.indexes import create_indexes
+
+from .models import Change, Comment, Review, User
+
+# Рейтинги произведений title_ids изменились без записи их строк
+# и строк их отзывов: отзывы автора скрылись или вернулись.
+titles_changed = Signal()
+
+POSTGRESQL_SEARCH_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS reviews_title_name_prefix '
+    'ON reviews_title (UPPER(name::text) text_pattern_ops)',
+)
+
+SQLITE_SEARCH_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS reviews_title_name_prefix '
+    'ON reviews_title (name COLLATE NOCASE)',
+)
+
+
+SEARCH_INDEXES = {
+    'postgresql': POSTGRESQL_SEARCH_INDEXES,
+    'sqlite': SQLITE_SEARCH_INDEXES,
+}
+
+
+def create_search_indexes(sender, using, **kwargs):
+    """Создает индекс для поиска произведений по префиксу названия
+    без учета регистра, который не выражается через Meta.indexes.
+    """
+    create_indexes(using, SEARCH_INDEXES)
+
+
+# Поле родителя, по которому объект адресуется в API.
+CHANGE_PARENTS = {
+    'review': 'title_id',
+    'comment': 'review_id',
+}
+
+
+def log_change(instance, action):
+    model = instance._meta.model_name
+    parent = CHANGE_PARENTS.get(model)
+    Change.objects.create(
+        model=model,
+        object_id=instance.pk,
+        parent_id=getattr(instance, parent) if parent else None,
+        action=action,
+    )
+
+
+def log_save(sender, instance, created, raw=False, **kwargs):
+    """Пишет изменение в журнал в той же транзакции, что и сам объект.
+    Скрытое до фонового удаления произведение и скрытые модератором
+    отзывы и комментарии считаются удаленными.
+    """
+    if raw:
+        return
+    if (getattr(instance, 'is_deleted', False)
+            or getattr(instance, 'is_hidden', False)):
+        action = Change.DELETE
+    else:
+        action = Change.CREATE if created else Change.UPDATE
+    log_change(instance, action)
+
+
+def log_delete(sender, instance, **kwargs):
+    log_change(instance, Change.DELETE)
+
+
+def log_user_saving(sender, instance, raw=False, update_fields=None,
+                    **kwargs):
+    if raw or instance.pk is None or (
+            update_fields is not None and 'is_deleted' not in update_fields):
+        return
+    instance._change_was_deleted = User.objects.filter(
+        pk=instance.pk, is_deleted=True).exists()
+
+
+def log_user_saved(sender, instance, raw=False, **kwargs):
+    """Отзывы и комментарии помеченного к удалению пользователя
+    пропадают из API, а при снятии пометки возвращаются: в журнал
+    пишутся их удаление или создание.
+    """
+    was_deleted = instance.__dict__.pop('_change_was_deleted', None)
+    if raw or was_deleted is None or was_deleted == instance.is_deleted:
+        return
+    action = Change.DELETE if instance.is_deleted else Change.CREATE
+    reviews = list(Review.objects.filter(
+        author=instance, is_hidden=False, title__is_deleted=False
+    ).values_list('pk', 'title_id'))
+    comments = Comment.objects.filter(
+        author=instance, is_hidden=False, review__is_hidden=False,
+        review__title__is_deleted=False
+    ).values_list('pk', 'review_id')
+    Change.objects.bulk_create(
+        [Change(model='review', object_id=pk, parent_id=parent_id,
+                action=action) for pk, parent_id in reviews]
+        + [Change(model='comment', object_id=pk, parent_id=parent_id,
+                  action=action) for pk, parent_id in comments],
+        batch_size=settings.CHANGE_FEED_BATCH_SIZE
+    )
+    title_ids = {title_id for _, title_id in reviews}
+    if title_ids:
+        titles_changed.send(sender=User, title_ids=title_ids)
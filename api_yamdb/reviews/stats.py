@@ -0,0 +1,386 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import (BigIntegerField, Case, Count, F, Q, Sum, Value,
+                              When)
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import (CatalogStat, Category, Genre, GenreTitle, Review, Title,
+                     User)
+
+# Отзыв учитывается в сводке, пока он виден в рейтинге произведения.
+VISIBLE = Q(is_hidden=False, author__is_deleted=False, title__is_deleted=False)
+
+# Произведения и пользователи, которые удаляются в этом потоке:
+# их вклад снят целиком до каскада, и удаление отзывов и связей
+# с жанрами по одному сводку уже не меняет.
+_deleting = threading.local()
+
+
+def deleting(kind):
+    if not hasattr(_deleting, kind):
+        setattr(_deleting, kind, set())
+    return getattr(_deleting, kind)
+
+
+@contextmanager
+def purging(kind, pk):
+    """Объект, уже снятый со сводки пометкой is_deleted, удаляется
+    по частям: обработчики удаления его отзывов и связей с жанрами
+    пропускают его без запросов к базе.
+    """
+    deleting(kind).add(pk)
+    try:
+        yield
+    finally:
+        deleting(kind).discard(pk)
+
+
+def groups_of(category_id, year, genre_ids):
+    groups = [(CatalogStat.YEAR, year)]
+    if category_id is not None:
+        groups.append((CatalogStat.CATEGORY, category_id))
+    return groups + [(CatalogStat.GENRE, genre_id) for genre_id in genre_ids]
+
+
+def title_groups(title_id):
+    """Разрезы, в которые входит произведение: год, категория и жанры.
+    Для скрытого до удаления произведения разрезов нет.
+    """
+    title = Title.objects.filter(pk=title_id, is_deleted=False).values_list(
+        'category_id', 'year').first()
+    if title is None:
+        return []
+    return groups_of(*title, GenreTitle.objects.filter(
+        title_id=title_id).values_list('genre_id', flat=True))
+
+
+def title_totals(title_id):
+    """Число и сумма оценок видимых отзывов произведения,
+    в том числе только что скрытого до удаления.
+    """
+    totals = Review.objects.filter(
+        is_hidden=False, author__is_deleted=False, title_id=title_id
+    ).aggregate(
+        reviews=Count('pk'), score_sum=Sum('score'))
+    return totals['reviews'], totals['score_sum'] or 0
+
+
+def label(dimension, key):
+    if dimension == CatalogStat.YEAR:
+        return '', str(key)
+    model = Category if dimension == CatalogStat.CATEGORY else Genre
+    return model.objects.filter(pk=key).values_list(
+        'slug', 'name').first() or ('', '')
+
+
+def apply(groups, titles=0, reviews=0, score_sum=0):
+    """Прибавляет одинаковые приращения к строкам разрезов."""
+    apply_deltas(dict.fromkeys(groups, (titles, reviews, score_sum)))
+
+
+def increment(field, position, deltas):
+    """Выражение "поле плюс приращение своей строки" для UPDATE."""
+    values = {delta[position] for delta in deltas.values()}
+    if len(values) == 1:
+        delta = Value(values.pop())
+    else:
+        delta = Case(
+            *[When(dimension=dimension, key=key, then=Value(delta[position]))
+              for (dimension, key), delta in deltas.items()],
+            default=Value(0), output_field=BigIntegerField()
+        )
+    return Greatest(F(field) + delta, 0)
+
+
+def apply_deltas(deltas):
+    """Прибавляет к строкам разрезов их приращения
+    {(разрез, ключ): (произведений, отзывов, сумма оценок)} одним UPDATE.
+    Недостающие строки создаются, гонка создания решается повтором UPDATE.
+    Счетчики не уходят ниже нуля, даже если сводка разошлась с данными
+    до следующего пересчета.
+    """
+    deltas = {group: delta for group, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    changes = {
+        field: increment(field, position, deltas)
+        for position, field in enumerate(('titles', 'reviews', 'score_sum'))
+    }
+    changes['updated_at'] = timezone.now()
+    condition = Q()
+    for dimension, key in deltas:
+        condition |= Q(dimension=dimension, key=key)
+    stats = CatalogStat.objects.filter(condition)
+    if stats.update(**changes) == len(deltas):
+        return
+    missing = set(deltas) - set(stats.values_list('dimension', 'key'))
+    for dimension, key in missing:
+        slug, name = label(dimension, key)
+        titles, reviews, score_sum = deltas[dimension, key]
+        try:
+            with transaction.atomic():
+                CatalogStat.objects.create(
+                    dimension=dimension, key=key, slug=slug, name=name,
+                    titles=max(titles, 0), reviews=max(reviews, 0),
+                    score_sum=max(score_sum, 0)
+                )
+        except IntegrityError:
+            CatalogStat.objects.filter(dimension=dimension, key=key).update(
+                **{field: Greatest(F(field) + value, 0) for field, value in
+                   zip(('titles', 'reviews', 'score_sum'),
+                       (titles, reviews, score_sum))},
+                updated_at=changes['updated_at']
+            )
+
+
+def apply_title(title_id, sign):
+    """Добавляет (sign=1) или снимает (sign=-1) произведение
+    вместе с его отзывами во всех его разрезах.
+    """
+    groups = title_groups(title_id)
+    if groups:
+        reviews, score_sum = title_totals(title_id)
+        apply(groups, sign, sign * reviews, sign * score_sum)
+
+
+def apply_genres(title_id, genre_ids, sign):
+    """Добавляет или снимает произведение в разрезах жанров."""
+    if (title_id in deleting('titles') or not Title.objects.filter(
+            pk=title_id, is_deleted=False).exists()):
+        return
+    reviews, score_sum = title_totals(title_id)
+    apply([(CatalogStat.GENRE, genre_id) for genre_id in genre_ids],
+          sign, sign * reviews, sign * score_sum)
+
+
+def apply_reviews(queryset, sign):
+    """Добавляет или снимает отзывы выборки для массовых операций
+    без сигналов: отзывы суммируются по разрезам их произведений
+    тремя запросами и ложатся в сводку одним UPDATE, сколько бы
+    произведений ни затронула выборка.
+    Выборка должна содержать только учитываемые в сводке отзывы.
+    """
+    queryset = queryset.order_by()
+    deltas = {}
+    for dimension, field in (
+            (CatalogStat.YEAR, 'title__year'),
+            (CatalogStat.CATEGORY, 'title__category_id'),
+            (CatalogStat.GENRE, 'title__genres__genre_id')):
+        totals = queryset.filter(**{f'{field}__isnull': False}).values(
+            field).annotate(reviews=Count('pk'), score_sum=Sum('score'))
+        for row in totals:
+            deltas[dimension, row[field]] = (
+                0, sign * row['reviews'], sign * row['score_sum'])
+    apply_deltas(deltas)
+
+
+def rebuild():
+    """Пересчитывает сводку по произведениям и отзывам.
+    Строки блокируются до конца транзакции, поэтому приращения
+    от параллельных записей ложатся поверх пересчитанных значений.
+    """
+    visible = Q(reviews__is_hidden=False, reviews__author__is_deleted=False)
+    aggregates = {
+        'title_count': Count('pk', distinct=True),
+        'review_count': Count('reviews', filter=visible),
+        'score_total': Sum('reviews__score', filter=visible),
+    }
+    titles = Title.objects.filter(is_deleted=False).order_by()
+    sources = (
+        (CatalogStat.CATEGORY, 'category_id',
+         titles.filter(category__isnull=False)),
+        (CatalogStat.YEAR, 'year', titles),
+        (CatalogStat.GENRE, 'genres__genre_id',
+         titles.filter(genres__isnull=False)),
+    )
+    with transaction.atomic():
+        existing = {
+            (stat.dimension, stat.key): stat
+            for stat in CatalogStat.objects.select_for_update()
+        }
+        labels = {
+            CatalogStat.CATEGORY: {
+                pk: (slug, name) for pk, slug, name
+                in Category.objects.values_list('pk', 'slug', 'name')},
+            CatalogStat.GENRE: {
+                pk: (slug, name) for pk, slug, name
+                in Genre.objects.values_list('pk', 'slug', 'name')},
+        }
+        now = timezone.now()
+        changed, created = [], []
+        for dimension, field, queryset in sources:
+            for row in queryset.values(field).annotate(**aggregates):
+                key = row[field]
+                slug, name = labels.get(dimension, {}).get(
+                    key, ('', str(key)))
+                stat = existing.pop((dimension, key), None)
+                if stat is None:
+                    stat = CatalogStat(dimension=dimension, key=key)
+                    created.append(stat)
+                else:
+                    changed.append(stat)
+                stat.slug, stat.name = slug, name
+                stat.titles = row['title_count']
+                stat.reviews = row['review_count']
+                stat.score_sum = row['score_total'] or 0
+                stat.updated_at = now
+        CatalogStat.objects.bulk_update(
+            changed,
+            ('slug', 'name', 'titles', 'reviews', 'score_sum', 'updated_at')
+        )
+        CatalogStat.objects.bulk_create(created)
+        CatalogStat.objects.filter(
+            pk__in=[stat.pk for stat in existing.values()]).delete()
+    return len(changed) + len(created)
+
+
+def review_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    score = None
+    if instance.pk is not None:
+        score = Review.objects.filter(VISIBLE, pk=instance.pk).values_list(
+            'score', flat=True).first()
+    instance._stats_before = (0, 0) if score is None else (1, score)
+
+
+def review_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    counted = not instance.is_hidden and not instance.author.is_deleted
+    reviews, score_sum = (1, instance.score) if counted else (0, 0)
+    before_reviews, before_score_sum = getattr(
+        instance, '_stats_before', (0, 0))
+    if reviews != before_reviews or score_sum != before_score_sum:
+        apply(title_groups(instance.title_id), 0,
+              reviews - before_reviews, score_sum - before_score_sum)
+
+
+def review_deleted(sender, instance, **kwargs):
+    if (instance.is_hidden
+            or instance.title_id in deleting('titles')
+            or instance.author_id in deleting('users')):
+        return
+    if User.objects.filter(pk=instance.author_id, is_deleted=False).exists():
+        apply(title_groups(instance.title_id), 0, -1, -instance.score)
+
+
+def title_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._stats_before = None
+    if instance.pk is not None:
+        instance._stats_before = Title.objects.filter(
+            pk=instance.pk).values('category_id', 'year', 'is_deleted').first()
+
+
+def title_saved(sender, instance, created, raw=False, **kwargs):
+    """Учитывает новое произведение, его скрытие до удаления
+    и переход в другую категорию или год.
+    """
+    if raw:
+        return
+    before = getattr(instance, '_stats_before', None)
+    if created or before is None:
+        if not instance.is_deleted:
+            apply(groups_of(instance.category_id, instance.year, ()), 1)
+        return
+    if before['is_deleted'] and instance.is_deleted:
+        return
+    if before['is_deleted']:
+        apply_title(instance.pk, 1)
+        return
+    old_groups = groups_of(before['category_id'], before['year'], ())
+    if instance.is_deleted:
+        old_groups += [
+            (CatalogStat.GENRE, genre_id) for genre_id
+            in instance.genres.values_list('genre_id', flat=True)
+        ]
+        new_groups = []
+    else:
+        new_groups = groups_of(instance.category_id, instance.year, ())
+    left = [group for group in old_groups if group not in new_groups]
+    joined = [group for group in new_groups if group not in old_groups]
+    if left or joined:
+        reviews, score_sum = title_totals(instance.pk)
+        apply(left, -1, -reviews, -score_sum)
+        apply(joined, 1, reviews, score_sum)
+
+
+def title_deleting(sender, instance, **kwargs):
+    apply_title(instance.pk, -1)
+    deleting('titles').add(instance.pk)
+
+
+def title_deleted(sender, instance, **kwargs):
+    deleting('titles').discard(instance.pk)
+
+
+def genre_title_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        apply_genres(instance.title_id, (instance.genre_id,), 1)
+
+
+def genre_title_deleted(sender, instance, **kwargs):
+    apply_genres(instance.title_id, (instance.genre_id,), -1)
+
+
+def genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Связи, добавленные через add и set: они вставляются bulk_create
+    без post_save. Удаление через remove, set и clear вызывает post_delete.
+    """
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for title_id in pk_set:
+            apply_genres(title_id, (instance.pk,), 1)
+    else:
+        apply_genres(instance.pk, pk_set, 1)
+
+
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None
+               and 'is_deleted' not in update_fields):
+        return
+    instance._stats_deleted = instance.pk is not None and User.objects.filter(
+        pk=instance.pk, is_deleted=True).exists()
+
+
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    """Отзывы заблокированного до удаления пользователя
+    выпадают из рейтингов, а при снятии пометки возвращаются.
+    """
+    if raw or created:
+        return
+    before = instance.__dict__.pop('_stats_deleted', instance.is_deleted)
+    if before != instance.is_deleted:
+        apply_reviews(
+            Review.objects.filter(
+                author=instance, is_hidden=False, title__is_deleted=False),
+            -1 if instance.is_deleted else 1
+        )
+
+
+def user_deleting(sender, instance, **kwargs):
+    apply_reviews(Review.objects.filter(VISIBLE, author_id=instance.pk), -1)
+    deleting('users').add(instance.pk)
+
+
+def user_deleted(sender, instance, **kwargs):
+    deleting('users').discard(instance.pk)
+
+
+def label_saved(sender, instance, raw=False, **kwargs):
+    dimension = (CatalogStat.CATEGORY if sender is Category
+                 else CatalogStat.GENRE)
+    CatalogStat.objects.filter(dimension=dimension, key=instance.pk).update(
+        slug=instance.slug, name=instance.name)
+
+
+def label_deleted(sender, instance, **kwargs):
+    dimension = (CatalogStat.CATEGORY if sender is Category
+                 else CatalogStat.GENRE)
+    CatalogStat.objects.filter(dimension=dimension, key=instance.pk).delete()
@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from reviews.admin_utils import EstimatedCountPaginator
 from .forms import CustomUserChangeForm, CustomUserCreationForm
-from .models import User
+from .models import RevokedToken, User
 
 
 class CustomUserAdmin(UserAdmin):
@@ -18,9 +19,17 @@ class CustomUserAdmin(UserAdmin):
         'role',
         'bio'
     )
-    search_fields = ('username',)
-    list_filter = ('username',)
+    search_fields = ('username', 'email')
+    list_filter = ('role',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, CustomUserAdmin)
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'key', 'revoked_at', 'expires_at')
+    search_fields = ('key',)
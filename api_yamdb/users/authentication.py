@@ -0,0 +1,14 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .revocation import denylist
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """JWT аутентификация с проверкой списка отозванных токенов."""
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if denylist.is_revoked(validated_token):
+            raise InvalidToken('Токен отозван.')
+        return validated_token
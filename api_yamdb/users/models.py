@@ -1,8 +1,13 @@
-import uuid
+import secrets
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-
 from django.db import models
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from api_yamdb.transactions import (TransactionOrderedQuerySet,
+                                    set_transaction_id)
 
 from .validators import validate_username
 
@@ -48,10 +53,23 @@ class User(AbstractUser):
         choices=ROLES,
         default=USER
     )
-    confirmation_code = models.UUIDField(
-        default=uuid.uuid4,
+    confirmation_code = models.CharField(
+        verbose_name='Хеш кода подтверждения',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    confirmation_code_expires = models.DateTimeField(
+        verbose_name='Код подтверждения действует до',
+        null=True,
+        blank=True,
         editable=False
     )
+    is_deleted = models.BooleanField(
+        verbose_name='Помечен к удалению',
+        default=False,
+        db_index=True
+    )
 
     @property
     def is_user(self):
@@ -65,6 +83,36 @@ class User(AbstractUser):
     def is_admin(self):
         return self.role == self.ADMIN
 
+    @staticmethod
+    def hash_confirmation_code(code):
+        return salted_hmac('users.confirmation_code', code).hexdigest()
+
+    def set_confirmation_code(self):
+        """Создает новый код подтверждения и возвращает его.
+        В модели хранится только хеш кода и срок его действия,
+        сохранение объекта остается за вызывающим кодом.
+        """
+        code = secrets.token_urlsafe(settings.CONFIRMATION_CODE_BYTES)
+        self.confirmation_code = self.hash_confirmation_code(code)
+        self.confirmation_code_expires = (
+            timezone.now() + settings.CONFIRMATION_CODE_LIFETIME)
+        return code
+
+    def check_confirmation_code(self, code):
+        return (
+            bool(self.confirmation_code)
+            and self.confirmation_code_expires is not None
+            and self.confirmation_code_expires > timezone.now()
+            and constant_time_compare(
+                self.confirmation_code, self.hash_confirmation_code(code))
+        )
+
+    def mark_deleted(self):
+        """Блокирует пользователя до фонового удаления его записей."""
+        self.is_deleted = True
+        self.is_active = False
+        self.save(update_fields=('is_deleted', 'is_active'))
+
     def __str__(self):
         return self.username
 
@@ -79,3 +127,51 @@ class User(AbstractUser):
                 name='unique_login_fields'
             ),
         )
+
+
+class RevokedTokenQuerySet(TransactionOrderedQuerySet):
+    settled_field = 'revoked_at'
+
+
+class RevokedToken(models.Model):
+    """Запись об отзыве JWT токена.
+    Ключ 'jti:<jti>' отзывает один токен, ключ 'user:<id>' отзывает
+    все токены пользователя, выданные до момента revoked_at.
+    Воркеры подгружают новые записи по курсору (txid, pk).
+    """
+    key = models.CharField(
+        verbose_name='Ключ',
+        max_length=64,
+        db_index=True
+    )
+    revoked_at = models.DateTimeField(
+        verbose_name='Дата отзыва',
+        default=timezone.now
+    )
+    expires_at = models.DateTimeField(
+        verbose_name='Хранить до',
+        db_index=True
+    )
+    txid = models.PositiveBigIntegerField(
+        verbose_name='Транзакция',
+        default=0,
+        editable=False,
+        help_text='Номер транзакции PostgreSQL, в которой сделана запись'
+    )
+
+    objects = RevokedTokenQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Отозванный токен'
+        verbose_name_plural = 'Отозванные токены'
+        indexes = (
+            models.Index(
+                fields=('txid', 'id'), name='revokedtoken_txid_id_idx'),
+        )
+
+    def save(self, *args, **kwargs):
+        set_transaction_id(self, kwargs)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+ACCESS_TOKEN_LIFETIME = api_settings.ACCESS_TOKEN_LIFETIME
+
+
+class BloomFilter:
+    """Компактное множество строк с ложноположительными ответами.
+    Число бит и хеш-функций подбирается по ожидаемой емкости
+    и допустимой доле ложных срабатываний.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(
+            -capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size
+                for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+
+class Denylist:
+    """Список отозванных токенов в памяти процесса.
+    Проверка токена выполняется по фильтру Блума без обращения к БД.
+    Только при попадании в фильтр ключ сверяется с таблицей
+    RevokedToken, результат сверки кешируется.
+    Новые записи подгружаются из таблицы не чаще раза
+    в REVOCATION_SYNC_INTERVAL секунд по курсору (txid, pk):
+    запись транзакции, которая фиксируется долго, не пропускается,
+    хотя ее id меньше уже прочитанных. Фильтр полностью
+    перестраивается раз в REVOCATION_REBUILD_INTERVAL секунд,
+    чтобы отбросить истекшие записи.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.confirmed = {}
+        self.cursor = (0, 0)
+        self.synced_at = 0
+        self.rebuilt_at = 0
+
+    def rebuild(self):
+        cursor = RevokedToken.objects.cursor()
+        keys = list(RevokedToken.objects.filter(
+            expires_at__gt=timezone.now()
+        ).values_list('key', flat=True))
+        capacity = max(settings.REVOCATION_CAPACITY, len(keys) * 2)
+        bloom = BloomFilter(capacity, settings.REVOCATION_ERROR_RATE)
+        for key in keys:
+            bloom.add(key)
+        self.bloom = bloom
+        self.confirmed = {}
+        self.cursor = cursor
+        self.rebuilt_at = self.synced_at = time.monotonic()
+
+    def sync(self):
+        now = time.monotonic()
+        rebuild_due = (
+            now - self.rebuilt_at > settings.REVOCATION_REBUILD_INTERVAL)
+        if self.bloom is None or rebuild_due:
+            return self.rebuild()
+        # Курсор сдвигается только по записям, перед которыми новые
+        # уже не появятся, остальные перечитываются при следующей сверке.
+        rows = RevokedToken.objects.after(self.cursor)
+        settled = rows.settled().values_list('txid', 'pk').last()
+        for key in rows.values_list('key', flat=True):
+            self.add(key)
+        if settled is not None:
+            self.cursor = settled
+        if self.bloom.count > self.bloom.capacity:
+            return self.rebuild()
+        self.synced_at = now
+        return None
+
+    def add(self, key):
+        if key not in self.bloom:
+            self.bloom.add(key)
+        self.confirmed.pop(key, None)
+
+    def ensure_fresh(self):
+        if (self.bloom is not None
+                and time.monotonic() - self.synced_at
+                < settings.REVOCATION_SYNC_INTERVAL):
+            return
+        with self.lock:
+            self.sync()
+
+    def revoked_before(self, key):
+        """Время последнего отзыва по ключу или None.
+        Вызывается только при попадании ключа в фильтр Блума.
+        """
+        if key not in self.confirmed:
+            self.confirmed[key] = RevokedToken.objects.filter(
+                key=key
+            ).order_by('-revoked_at').values_list(
+                'revoked_at', flat=True
+            ).first()
+        return self.confirmed[key]
+
+    def is_revoked(self, token):
+        self.ensure_fresh()
+        jti_key = f'jti:{token[api_settings.JTI_CLAIM]}'
+        if jti_key in self.bloom and self.revoked_before(jti_key):
+            return True
+        user_key = f'user:{token[api_settings.USER_ID_CLAIM]}'
+        if user_key not in self.bloom:
+            return False
+        revoked_at = self.revoked_before(user_key)
+        if revoked_at is None:
+            return False
+        issued_at = datetime.fromtimestamp(
+            token['exp'], tz=dt_timezone.utc) - ACCESS_TOKEN_LIFETIME
+        return issued_at <= revoked_at
+
+    def revoke(self, key, expires_at):
+        revoked = RevokedToken.objects.create(key=key, expires_at=expires_at)
+        with self.lock:
+            if self.bloom is not None:
+                self.add(key)
+        return revoked
+
+    def revoke_token(self, token):
+        """Отзывает один токен до окончания срока его действия."""
+        return self.revoke(
+            f'jti:{token[api_settings.JTI_CLAIM]}',
+            datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        )
+
+    def revoke_user(self, user):
+        """Отзывает все токены пользователя, выданные к этому моменту."""
+        return self.revoke(
+            f'user:{user.pk}', timezone.now() + ACCESS_TOKEN_LIFETIME)
+
+
+denylist = Denylist()
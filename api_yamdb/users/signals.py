@@ -0,0 +1,39 @@
+from api_yamdb.indexes import create_indexes
+
+POSTGRESQL_SEARCH_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    # icontains в PostgreSQL сравнивает UPPER(столбец::text), поэтому
+    # индексы строятся по тому же выражению, а не по столбцу.
+    'DROP INDEX IF EXISTS users_user_username_trgm',
+    'DROP INDEX IF EXISTS users_user_email_trgm',
+    'CREATE INDEX IF NOT EXISTS users_user_username_upper_trgm '
+    'ON users_user USING gin (UPPER(username::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS users_user_email_upper_trgm '
+    'ON users_user USING gin (UPPER(email::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS users_user_username_prefix '
+    'ON users_user (UPPER(username::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS users_user_email_prefix '
+    'ON users_user (UPPER(email::text) text_pattern_ops)',
+)
+
+SQLITE_SEARCH_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS users_user_username_prefix '
+    'ON users_user (username COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS users_user_email_prefix '
+    'ON users_user (email COLLATE NOCASE)',
+)
+
+
+SEARCH_INDEXES = {
+    'postgresql': POSTGRESQL_SEARCH_INDEXES,
+    'sqlite': SQLITE_SEARCH_INDEXES,
+}
+
+
+def create_search_indexes(sender, using, **kwargs):
+    """Создает индексы для поиска пользователей после миграций.
+    В PostgreSQL это триграммные индексы pg_trgm и индексы
+    для поиска по префиксу без учета регистра, в SQLite
+    индексы по префиксу с NOCASE.
+    """
+    create_indexes(using, SEARCH_INDEXES)
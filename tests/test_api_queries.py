@@ -0,0 +1,212 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api import autocomplete
+from reviews.models import Category, Comment, Genre, Review, Title, User
+
+TITLES_NUM = 3
+AUTHORS_NUM = 3
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(settings):
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    settings.COALESCE_TTL = 0
+    settings.CHANGE_FEED_LAG = timedelta(0)
+    autocomplete._index = None
+    yield
+    autocomplete._index = None
+
+
+@pytest.fixture
+def admin(db):
+    return User.objects.create(
+        username='admin', email='admin@yamdb.fake', role=User.ADMIN)
+
+
+@pytest.fixture
+def catalog(db, admin):
+    """Произведения с двумя жанрами, отзывом каждого автора
+    и комментарием каждого автора к каждому отзыву.
+    """
+    category = Category.objects.create(name='Книги', slug='books')
+    genres = [
+        Genre.objects.create(name=name, slug=slug)
+        for name, slug in (('Драма', 'drama'), ('Комедия', 'comedy'))
+    ]
+    authors = [
+        User.objects.create(username=f'author{i}', email=f'a{i}@yamdb.fake')
+        for i in range(AUTHORS_NUM)
+    ]
+    titles = []
+    for i in range(TITLES_NUM):
+        title = Title.objects.create(
+            name=f'Мастер {i}', year=2000 + i, category=category,
+            description='Описание')
+        title.genre.add(*genres)
+        titles.append(title)
+        for author in authors:
+            review = Review.objects.create(
+                title=title, author=author, text='Отзыв', score=5 + i)
+            for commenter in authors:
+                Comment.objects.create(
+                    review=review, author=commenter, text='Комментарий')
+    return {'titles': titles, 'authors': authors}
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def get(client, url, queries, **params):
+    """GET с проверкой числа запросов к базе."""
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url, params)
+    assert response.status_code == 200, response.content
+    assert len(captured) == queries, '\n'.join(
+        query['sql'] for query in captured.captured_queries)
+    return response.json(), [query['sql'] for query in captured]
+
+
+@pytest.mark.django_db
+class TestTitleQueries:
+
+    def test_list(self, catalog, query_inspector):
+        data, _ = get(client_for(), '/api/v1/titles/', 3)
+        assert len(data['results']) == TITLES_NUM
+        assert data['results'][0]['rating'] == 5
+        assert len(data['results'][0]['genre']) == 2
+
+    def test_retrieve(self, catalog, query_inspector):
+        title = catalog['titles'][0]
+        data, _ = get(client_for(), f'/api/v1/titles/{title.pk}/', 2)
+        assert data['category'] == {'name': 'Книги', 'slug': 'books'}
+
+    def test_sparse_fields_prune_sql(self, catalog, query_inspector):
+        data, sql = get(
+            client_for(), '/api/v1/titles/', 2, fields='id,name')
+        assert data['results'][0] == {
+            'id': catalog['titles'][0].pk, 'name': 'Мастер 0'}
+        assert 'AVG' not in sql[1]
+        assert 'description' not in sql[1]
+        assert 'reviews_category' not in sql[1]
+
+    def test_sparse_omit(self, catalog, query_inspector):
+        data, sql = get(client_for(), '/api/v1/titles/', 3, omit='rating')
+        assert 'rating' not in data['results'][0]
+        assert 'AVG' not in sql[1]
+
+    def test_sparse_unknown_field(self, catalog):
+        response = client_for().get('/api/v1/titles/', {'fields': 'bogus'})
+        assert response.status_code == 400
+
+    def test_autocomplete_reads_memory(self, catalog, query_inspector):
+        client = client_for()
+        client.get('/api/v1/titles/autocomplete/', {'q': 'мас'})
+        data, _ = get(
+            client, '/api/v1/titles/autocomplete/', 0, q='МАС', limit=2)
+        assert [item['name'] for item in data] == ['Мастер 2', 'Мастер 1']
+
+    def test_autocomplete_sync_swaps_copy(self, catalog, monkeypatch):
+        closed = []
+        monkeypatch.setattr(
+            autocomplete.connections, 'close_all', lambda: closed.append(1))
+        autocomplete.warm_up()
+        index = autocomplete._index
+        assert index is not None, 'Прогрев должен строить индекс подсказок'
+        assert closed, 'Прогрев должен закрывать соединения перед fork'
+        title = catalog['titles'][0]
+        title.name = 'Идиот'
+        title.save()
+        synced = index.synced('new')
+        assert autocomplete.publish(synced, index) is synced
+        assert [item['name'] for item in index.search('мас', 5)] == [
+            'Мастер 2', 'Мастер 1', 'Мастер 0'], (
+            'Синхронизация не должна менять опубликованный индекс'
+        )
+        assert [item['name'] for item in synced.search('ид', 5)] == [
+            'Идиот']
+        assert autocomplete.publish(index, index) is synced, (
+            'Устаревшая копия не должна заменять более новый индекс'
+        )
+
+    def test_autocomplete_user_soft_delete(self, catalog, settings):
+        title = catalog['titles'][0]
+        critic = User.objects.create(username='critic', email='c@yamdb.fake')
+        Review.objects.create(title=title, author=critic, text='Да', score=10)
+        index = autocomplete.build()
+        assert index.search('мастер 0', 1)[0]['rating'] == 6
+        critic.mark_deleted()
+        settings.AUTOCOMPLETE_SYNC_INTERVAL = 0
+        synced = autocomplete.refreshed(index)
+        assert synced.search('мастер 0', 1)[0]['rating'] == 5, (
+            'Отзывы скрытого пользователя не должны входить в рейтинг'
+        )
+        settings.AUTOCOMPLETE_REBUILD_INTERVAL = 0
+        rebuilt = autocomplete.refreshed(synced)
+        assert rebuilt.built_at > index.built_at
+        assert rebuilt.search('мастер 0', 1)[0]['rating'] == 5
+
+
+@pytest.mark.django_db
+class TestReviewQueries:
+
+    def test_reviews_list(self, catalog, query_inspector):
+        title = catalog['titles'][0]
+        data, _ = get(
+            client_for(), f'/api/v1/titles/{title.pk}/reviews/', 3)
+        assert {review['author'] for review in data['results']} == {
+            author.username for author in catalog['authors']}
+
+    def test_comments_list(self, catalog, query_inspector):
+        review = catalog['titles'][0].reviews.first()
+        data, _ = get(
+            client_for(),
+            f'/api/v1/titles/{review.title_id}/reviews/{review.pk}/comments/',
+            3)
+        assert len(data['results']) == AUTHORS_NUM
+
+    def test_activity_pages(self, catalog, query_inspector):
+        author = catalog['authors'][0]
+        client = client_for(author)
+        data, _ = get(client, '/api/v1/users/me/activity/', 2)
+        seen = len(data['results'])
+        while data['next']:
+            data, _ = get(client, data['next'], 2)
+            seen += len(data['results'])
+        assert seen == TITLES_NUM + TITLES_NUM * AUTHORS_NUM
+
+
+@pytest.mark.django_db
+class TestFeedQueries:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_changes(self, catalog, admin, query_inspector):
+        # Журнал отдает только записи завершенных транзакций.
+        client = client_for(admin)
+        data, _ = get(client, '/api/v1/changes/', 1, model='title')
+        assert [change['object_id'] for change in data['results']] == [
+            title.pk for title in catalog['titles']]
+        data, _ = get(
+            client, '/api/v1/changes/', 1,
+            model='title', since=data['cursor'])
+        assert data['results'] == [], (
+            'Курсор следующего опроса должен указывать за последнюю запись'
+        )
+
+    def test_stats(self, catalog, query_inspector):
+        data, _ = get(client_for(), '/api/v1/stats/', 1)
+        assert data['categories'][0]['titles'] == TITLES_NUM
+        assert data['categories'][0]['reviews'] == TITLES_NUM * AUTHORS_NUM
+        assert len(data['genres']) == 2
+        assert len(data['years']) == TITLES_NUM
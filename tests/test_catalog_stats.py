@@ -0,0 +1,141 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from reviews import stats
+from reviews.models import (CatalogStat, Category, Genre, Review, Title,
+                            User)
+
+
+def snapshot():
+    """Ненулевые строки сводки: пересчет не хранит пустые разрезы."""
+    return sorted(
+        row for row in CatalogStat.objects.values_list(
+            'dimension', 'key', 'titles', 'reviews', 'score_sum')
+        if any(row[2:])
+    )
+
+
+def assert_matches_rebuild():
+    incremental = snapshot()
+    stats.rebuild()
+    assert incremental == snapshot(), (
+        'Сводка, обновленная при записи, разошлась с пересчетом'
+    )
+
+
+@pytest.fixture
+def catalog(db):
+    books = Category.objects.create(name='Книги', slug='books')
+    films = Category.objects.create(name='Фильмы', slug='films')
+    drama = Genre.objects.create(name='Драма', slug='drama')
+    comedy = Genre.objects.create(name='Комедия', slug='comedy')
+    authors = [
+        User.objects.create(username=f'author{i}', email=f'a{i}@yamdb.fake')
+        for i in range(3)
+    ]
+    titles = []
+    for i in range(3):
+        title = Title.objects.create(
+            name=f'Произведение {i}', year=2000 + i % 2, category=books)
+        title.genre.add(drama)
+        titles.append(title)
+        for score, author in enumerate(authors, start=i + 5):
+            Review.objects.create(
+                title=title, author=author, text='Отзыв', score=score)
+    return {
+        'titles': titles, 'authors': authors,
+        'categories': (books, films), 'genres': (drama, comedy),
+    }
+
+
+@pytest.mark.django_db
+class TestCatalogStats:
+
+    def test_reviews(self, catalog):
+        title = catalog['titles'][0]
+        review = Review.objects.create(
+            title=title, text='Отзыв', score=10,
+            author=User.objects.create(username='new', email='n@yamdb.fake'))
+        assert_matches_rebuild()
+        review.score = 1
+        review.save()
+        assert_matches_rebuild()
+        review.delete()
+        assert_matches_rebuild()
+
+    def test_user_soft_delete(self, catalog):
+        author = catalog['authors'][0]
+        author.mark_deleted()
+        assert_matches_rebuild()
+        # Сохранение других полей не должно снова снимать его отзывы.
+        author.first_name = 'Удален'
+        author.save(update_fields=('first_name',))
+        assert_matches_rebuild()
+        author.is_deleted = False
+        author.save()
+        assert_matches_rebuild()
+
+    def test_title_moves(self, catalog):
+        title = catalog['titles'][0]
+        title.category = catalog['categories'][1]
+        title.year = 1999
+        title.save()
+        assert_matches_rebuild()
+        title.mark_deleted()
+        assert_matches_rebuild()
+
+    def test_genres(self, catalog):
+        drama, comedy = catalog['genres']
+        title = catalog['titles'][1]
+        title.genre.add(comedy)
+        assert_matches_rebuild()
+        title.genre.remove(drama)
+        assert_matches_rebuild()
+        comedy.title_set.add(catalog['titles'][2])
+        assert_matches_rebuild()
+
+    def test_moderation(self, catalog):
+        moderator = User.objects.create(
+            username='moderator', email='m@yamdb.fake',
+            role=User.MODERATOR)
+        client = APIClient()
+        client.force_authenticate(moderator)
+        author = catalog['authors'][1]
+        with CaptureQueriesContext(connection) as captured:
+            response = client.post(
+                '/api/v1/moderation/',
+                {'action': 'hide', 'target': 'reviews',
+                 'author': author.username},
+                format='json'
+            )
+        assert response.status_code == 200, response.content
+        assert response.json()['reviews'] == len(catalog['titles'])
+        stat_updates = [
+            query['sql'] for query in captured.captured_queries
+            if query['sql'].startswith('UPDATE "reviews_catalogstat"')
+        ]
+        assert len(stat_updates) == 1, (
+            'Сводка должна обновляться одним запросом на пачку, '
+            'а не запросом на каждое произведение'
+        )
+        assert_matches_rebuild()
+
+    def test_purge_skips_stats(self, catalog):
+        title = catalog['titles'][0]
+        title.mark_deleted()
+        author = catalog['authors'][2]
+        author.mark_deleted()
+        with CaptureQueriesContext(connection) as captured:
+            call_command('purge_deleted', '--batch-size', '1', stdout=None)
+        stat_queries = [
+            query['sql'] for query in captured.captured_queries
+            if 'reviews_catalogstat' in query['sql']
+            or '"users_user"."is_deleted"' in query['sql']
+        ]
+        # Снятие произведения и пользователя целиком, не по отзыву.
+        assert len(stat_queries) <= 4, '\n'.join(stat_queries)
+        assert not Title.objects.filter(pk=title.pk).exists()
+        assert_matches_rebuild()
@@ -0,0 +1,106 @@
+import pytest
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from api import autocomplete, coalescing
+from reviews.models import Review, Title, User
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+
+
+@pytest.mark.django_db
+class TestInvalidateTitles:
+
+    def test_one_bump_per_transaction(
+            self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            coalescing.invalidate_titles([1])
+            coalescing.invalidate_titles([2, 3])
+        assert len(callbacks) == 1, (
+            'За транзакцию должна регистрироваться одна смена версий'
+        )
+        assert callbacks[0].title_ids == {1, 2, 3}
+        with django_capture_on_commit_callbacks() as callbacks:
+            coalescing.invalidate_titles([4])
+        assert [bump.title_ids for bump in callbacks] == [{4}], (
+            'Новая смена версий не должна дописываться в выполненную'
+        )
+
+    def test_rolled_back_savepoint(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            with pytest.raises(RuntimeError):
+                with transaction.atomic():
+                    coalescing.invalidate_titles([1])
+                    raise RuntimeError
+            coalescing.invalidate_titles([2])
+        assert [bump.title_ids for bump in callbacks] == [{2}]
+
+
+class TestSharedLock:
+
+    @pytest.mark.parametrize('backend, expected', (
+        ('django.core.cache.backends.filebased.FileBasedCache', False),
+        ('django.core.cache.backends.locmem.LocMemCache', False),
+        ('django.core.cache.backends.memcached.PyMemcacheCache', True),
+        ('django_redis.cache.RedisCache', True),
+    ))
+    def test_backends(self, settings, backend, expected):
+        settings.CACHES = {'default': {'BACKEND': backend}}
+        assert coalescing.shared_lock() is expected
+
+    def test_file_cache_skips_lock(self, settings, monkeypatch, tmp_path):
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        }}
+        monkeypatch.setattr(
+            coalescing.cache, 'add',
+            lambda *args: pytest.fail('cache.add без атомарного бэкенда'))
+        assert coalescing.refresh('key', (), None, lambda: 'data') == 'data'
+
+
+@pytest.mark.django_db
+class TestCoalescedRead:
+
+    def test_leading_zeros_share_version(
+            self, settings, django_capture_on_commit_callbacks):
+        settings.COALESCE_TTL = 30
+        with django_capture_on_commit_callbacks(execute=True):
+            title = Title.objects.create(name='Было', year=2000)
+        url = f'/api/v1/titles/0{title.pk}/'
+        client = APIClient()
+        assert client.get(url).json()['name'] == 'Было'
+        with django_capture_on_commit_callbacks(execute=True):
+            title.name = 'Стало'
+            title.save()
+        assert client.get(url).json()['name'] == 'Стало', (
+            'Правка произведения должна сбрасывать и адрес с ведущим нулем'
+        )
+
+    def test_non_numeric_pk(self, settings):
+        settings.COALESCE_TTL = 30
+        assert APIClient().get('/api/v1/titles/abc/').status_code == 404
+
+    def test_user_soft_delete_bumps_versions(
+            self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            title = Title.objects.create(name='Было', year=2000)
+            author = User.objects.create(username='a', email='a@yamdb.fake')
+            Review.objects.create(
+                title=title, author=author, text='Отзыв', score=5)
+        keys = (coalescing.title_version_key(title.pk),
+                autocomplete.VERSION_KEY)
+        before = cache.get_many(keys)
+        with django_capture_on_commit_callbacks(execute=True):
+            author.mark_deleted()
+        after = cache.get_many(keys)
+        assert all(after[key] != before[key] for key in keys), (
+            'Скрытие отзывов автора меняет рейтинг произведения'
+        )
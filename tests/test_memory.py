@@ -0,0 +1,35 @@
+import os
+import tracemalloc
+
+import pytest
+
+from api import memory
+
+# Больше максимального pid в Linux: такого процесса быть не может.
+DEAD_PID = 999999999
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, settings):
+    settings.MEMORY_SNAPSHOT_DIR = str(tmp_path)
+    tracing = tracemalloc.is_tracing()
+    yield tmp_path
+    if not tracing:
+        tracemalloc.stop()
+
+
+class TestSnapshots:
+
+    def test_prunes_dead_workers_and_own_limit(self, snapshot_dir):
+        dead = snapshot_dir / f'{DEAD_PID}-1.dump'
+        dead.write_bytes(b'')
+        for number in range(memory.SNAPSHOT_LIMIT):
+            (snapshot_dir / f'{os.getpid()}-{number}.dump').write_bytes(b'')
+        snapshot_id = memory.take_snapshot()
+        assert not dead.exists(), (
+            'Снимки завершившихся воркеров должны удаляться'
+        )
+        snapshots = memory.list_snapshots()
+        assert len(snapshots) == memory.SNAPSHOT_LIMIT
+        assert snapshots[-1] == snapshot_id
+        assert f'{os.getpid()}-0' not in snapshots
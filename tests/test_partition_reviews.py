@@ -0,0 +1,87 @@
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+from reviews.models import Comment, Review, Title, User
+
+CONSTRAINTS_SQL = (
+    'SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint '
+    'WHERE conrelid = %s::regclass'
+)
+
+
+def constraints(table):
+    with connection.cursor() as cursor:
+        cursor.execute(CONSTRAINTS_SQL, [table])
+        return {name: (kind, definition)
+                for name, kind, definition in cursor.fetchall()}
+
+
+def partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = %s::regclass', [table])
+        return cursor.fetchone() is not None
+
+
+@pytest.fixture
+def reviews(db):
+    if connection.vendor != 'postgresql':
+        pytest.skip('Секционирование есть только в PostgreSQL')
+    authors = [
+        User.objects.create(username=f'author{i}', email=f'a{i}@yamdb.fake')
+        for i in range(2)
+    ]
+    for i in range(3):
+        title = Title.objects.create(name=f'Произведение {i}', year=2000)
+        for author in authors:
+            review = Review.objects.create(
+                title=title, author=author, text='Отзыв', score=7)
+            Comment.objects.create(
+                review=review, author=author, text='Комментарий')
+    return authors
+
+
+@pytest.mark.django_db
+class TestPartitionReviews:
+
+    def test_hash_keeps_constraints_and_rows(self, reviews):
+        review_table = Review._meta.db_table
+        comment_table = Comment._meta.db_table
+        before = constraints(comment_table)
+        call_command(
+            'partition_reviews', '--partitions', '4', '--drop-foreign-keys')
+        assert partitioned(review_table) and partitioned(comment_table)
+        assert Review.objects.count() == 6
+        assert Comment.objects.count() == 6
+        kept = constraints(review_table)
+        assert 'unique_review' in kept, (
+            'unique_review включает title_id и должен сохраниться'
+        )
+        primary = [
+            definition for kind, definition in kept.values() if kind == 'p']
+        assert primary == ['PRIMARY KEY (id, title_id)']
+        lost = {
+            name for name, (kind, _) in before.items() if kind == 'f'
+        } - set(constraints(comment_table))
+        assert len(lost) == 1, 'Удаляется только внешний ключ на отзывы'
+        new = Review.objects.create(
+            title=Title.objects.first(), author=User.objects.create(
+                username='new', email='n@yamdb.fake'),
+            text='Отзыв', score=1)
+        assert new.pk > max(
+            Review.objects.exclude(pk=new.pk).values_list('pk', flat=True))
+
+    def test_foreign_keys_need_consent(self, reviews):
+        with pytest.raises(CommandError, match='--drop-foreign-keys'):
+            call_command('partition_reviews', '--partitions', '4')
+        assert not partitioned(Review._meta.db_table)
+
+    def test_range_keeps_unique_review(self, reviews):
+        with pytest.raises(CommandError, match='unique_review'):
+            call_command(
+                'partition_reviews', '--strategy', 'range',
+                '--drop-foreign-keys')
+        assert not partitioned(Review._meta.db_table)
+        assert 'unique_review' in constraints(Review._meta.db_table)
@@ -0,0 +1,43 @@
+import pytest
+from django.core.management import call_command
+
+from api.management.commands import replay_log
+from reviews.models import Category, User
+
+LOG_LINE = ('127.0.0.1 - - [10/Oct/2024:13:55:0{second} +0000] '
+            '"{method} {path} HTTP/1.1" 200 10 "-" "-"\n')
+
+
+@pytest.fixture
+def access_log(tmp_path):
+    log = tmp_path / 'access.log'
+    log.write_text(''.join(
+        LOG_LINE.format(second=second, method=method, path=path)
+        for second, (method, path) in enumerate((
+            ('GET', '/api/v1/categories/'),
+            ('DELETE', '/api/v1/categories/books/'),
+        ))
+    ))
+    return str(log)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplayLog:
+
+    def test_local_writes_are_rolled_back(
+            self, access_log, capsys, monkeypatch):
+        # Тестовое окружение уже подготовлено pytest-django.
+        monkeypatch.setattr(
+            replay_log, 'setup_test_environment', lambda: None)
+        Category.objects.create(name='Книги', slug='books')
+        call_command(
+            'replay_log', access_log, '--include-writes', '--speed', '0',
+            '--concurrency', '1')
+        assert 'DELETE /api/v1/categories/' in capsys.readouterr().out
+        assert Category.objects.filter(slug='books').exists(), (
+            'Изменяющие запросы при повторе в процессе '
+            'не должны менять базу'
+        )
+        assert not User.objects.exists(), (
+            'Временные пользователи удаляются после повтора'
+        )
@@ -0,0 +1,43 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import RevokedToken
+from users.revocation import Denylist
+
+
+@pytest.mark.django_db(transaction=True)
+class TestDenylistSync:
+
+    def test_late_commit_with_lower_id(self):
+        if connection.vendor != 'postgresql':
+            pytest.skip('Курсор по номерам транзакций есть в PostgreSQL')
+        denylist = Denylist()
+        denylist.sync()
+        expires_at = timezone.now() + timedelta(hours=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_revoke():
+            with transaction.atomic():
+                RevokedToken.objects.create(
+                    key='jti:slow', expires_at=expires_at)
+                started.set()
+                release.wait()
+            connection.close()
+
+        thread = threading.Thread(target=slow_revoke)
+        thread.start()
+        started.wait()
+        RevokedToken.objects.create(key='jti:fast', expires_at=expires_at)
+        denylist.sync()
+        assert 'jti:fast' in denylist.bloom
+        release.set()
+        thread.join()
+        denylist.sync()
+        assert 'jti:slow' in denylist.bloom, (
+            'Отзыв, зафиксированный позже записи с большим id, '
+            'не должен пропускаться до перестройки фильтра'
+        )
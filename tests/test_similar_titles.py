@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from reviews.models import Change, Review, SimilarTitle, Title, User
+
+
+@pytest.fixture
+def scores(transactional_db, settings):
+    settings.CHANGE_FEED_LAG = timedelta(0)
+    titles = [Title.objects.create(name=f'Произведение {i}', year=2000)
+              for i in range(4)]
+    authors = [
+        User.objects.create(username=f'author{i}', email=f'a{i}@yamdb.fake')
+        for i in range(4)
+    ]
+    for i, author in enumerate(authors):
+        for j, title in enumerate(titles[:3]):
+            Review.objects.create(
+                title=title, author=author, text='Отзыв',
+                score=1 + (i * 3 + j * 5) % 10)
+    return titles, authors
+
+
+def computed_at(title):
+    return set(SimilarTitle.objects.filter(title=title).values_list(
+        'computed_at', flat=True))
+
+
+@pytest.mark.django_db(transaction=True)
+class TestIncrementalSimilarTitles:
+
+    def test_late_commit_is_not_skipped(self, scores):
+        titles, authors = scores
+        call_command('build_similar_titles', stdout=None)
+        before = computed_at(titles[0])
+        assert before, 'Полный расчет должен построить списки'
+        # Изменение из долгой транзакции: время записи раньше
+        # прошлого запуска, но в журнале оно после его курсора.
+        Review.objects.create(
+            title=titles[3], author=authors[0], text='Отзыв', score=9)
+        Change.objects.filter(model='review', parent_id=titles[3].pk).update(
+            changed_at=timezone.now() - timedelta(days=1))
+        call_command('build_similar_titles', '--incremental', stdout=None)
+        assert SimilarTitle.objects.filter(title=titles[3]).exists(), (
+            'Инкрементальный расчет должен читать журнал по курсору, '
+            'а не по времени записи'
+        )
+        assert computed_at(titles[0]) == before, (
+            'Списки, не затронутые изменением, не пересчитываются'
+        )
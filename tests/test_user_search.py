@@ -0,0 +1,77 @@
+import re
+
+from django.db import connections
+from django.db.backends.postgresql.base import DatabaseWrapper
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import UserSearchFilter
+from api.pagination import UserSearchPagination
+from api.views import UserViewSet
+from users.models import User
+from users.signals import POSTGRESQL_SEARCH_INDEXES
+
+ALIAS = 'postgresql_shape'
+COLUMNS = ('username', 'email')
+
+
+def search_sql(term):
+    """SQL поиска пользователей, скомпилированный для PostgreSQL
+    без подключения к базе.
+    """
+    connections[ALIAS] = DatabaseWrapper(
+        dict(connections['default'].settings_dict), ALIAS)
+    try:
+        request = Request(RequestFactory().get('/', {'search': term}))
+        queryset = UserSearchFilter().filter_queryset(
+            request, User.objects.using(ALIAS), None)
+        sql, _ = queryset.query.get_compiler(ALIAS).as_sql()
+    finally:
+        del connections[ALIAS]
+    return sql.split(' WHERE ', 1)[1]
+
+
+def indexed_expressions(opclass):
+    return {
+        match[1] for match in (
+            re.search(r'\((UPPER\(\w+::text\)) ' + opclass + r'\)', statement)
+            for statement in POSTGRESQL_SEARCH_INDEXES
+        ) if match
+    }
+
+
+class TestUserSearchIndexes:
+
+    def test_substring_search_uses_trigram_indexes(self):
+        where = search_sql('alice')
+        expressions = indexed_expressions('gin_trgm_ops')
+        for column in COLUMNS:
+            assert f'UPPER({column}::text)' in expressions, (
+                f'Проверьте, что триграммный индекс по {column} построен '
+                f'по выражению UPPER({column}::text)'
+            )
+            assert f'UPPER("users_user"."{column}"::text) LIKE' in where, (
+                f'Проверьте, что поиск по подстроке сравнивает '
+                f'UPPER({column}::text), как триграммный индекс'
+            )
+
+    def test_prefix_search_uses_prefix_indexes(self):
+        where = search_sql('al')
+        expressions = indexed_expressions('text_pattern_ops')
+        for column in COLUMNS:
+            assert f'UPPER({column}::text)' in expressions
+            assert f'UPPER("users_user"."{column}"::text) LIKE' in where
+
+
+class TestUserSearchPagination:
+
+    def test_search_paginator_keeps_view_state(self):
+        view = UserViewSet()
+        view.request = Request(RequestFactory().get('/', {'search': 'al'}))
+        assert isinstance(view.paginator, UserSearchPagination)
+        assert view.pagination_class is UserViewSet.pagination_class, (
+            'Выбор постраничного вывода не должен менять атрибуты вьюсета'
+        )
+        view = UserViewSet()
+        view.request = Request(RequestFactory().get('/'))
+        assert not isinstance(view.paginator, UserSearchPagination)